@@ -1,24 +1,30 @@
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 import os
-import shutil
-import base64
+import asyncio
+import socket
+from functools import lru_cache
 from typing import List
 import uuid
-from services.street_view_service import StreetViewService
-from services.black_forest_api import process_image_with_prompt
+from services.street_view_service import AsyncStreetViewService, close_shared_clients
+from services.black_forest_api import process_image_with_prompt, result_cache
+from routers.sessions import session_router, session_store
 import logging
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
+# httpx logs every request at INFO, which would mean a line per Black Forest status poll
+logging.getLogger("httpx").setLevel(logging.WARNING)
 
 app = FastAPI(
     title="Street View AI Processing API",
     description="API for getting Street View images and processing with Black Forest Labs AI",
-    version="1.0.0"
+    version="1.0.0",
+    # Serialize responses with orjson instead of the stdlib json module
+    default_response_class=ORJSONResponse
 )
 
 # Add CORS middleware for public access
@@ -31,27 +37,88 @@ app.add_middleware(
     expose_headers=["*"],  # Expose all headers
 )
 
+# Session status, download and management endpoints
+app.include_router(session_router)
+
 # Initialize services
-street_view_service = StreetViewService()
+street_view_service = AsyncStreetViewService()
 
 # Ensure output directory exists
 os.makedirs("output", exist_ok=True)
 
-def encode_image_to_base64(filepath: str) -> str:
-    """Encode an image file to base64 string"""
-    try:
-        with open(filepath, 'rb') as image_file:
-            encoded_string = base64.b64encode(image_file.read()).decode('utf-8')
-            return encoded_string
-    except Exception as e:
-        logger.error(f"Error encoding image {filepath}: {str(e)}")
-        return ""
+# Sessions older than this are deleted periodically; unset keeps them forever
+SESSION_TTL_HOURS = os.environ.get("SESSION_TTL_HOURS")
 
 class ProcessRequest(BaseModel):
+    # Immutable and strict: unknown fields are rejected instead of collected
+    model_config = ConfigDict(extra="forbid", frozen=True)
+    
     address: str
     prompt: str
     angles: List[int] = [0, 90, 180, 270]  # Default to 4 cardinal directions
 
+async def purge_expired_sessions(ttl_hours: float):
+    """Delete expired sessions and cached images once an hour, off the event loop"""
+    while True:
+        # A failed pass is logged and retried next hour instead of ending the loop
+        try:
+            purged = await asyncio.to_thread(session_store.purge_expired, ttl_hours * 3600, ("cache",))
+            if purged:
+                logger.info(f"Purged {len(purged)} expired sessions")
+            
+            # Cached AI results and Street View images expire with the same TTL
+            evicted = 0
+            for cache in (result_cache, street_view_service.image_cache):
+                evicted += await asyncio.to_thread(cache.purge_expired, ttl_hours * 3600)
+            if evicted:
+                logger.info(f"Evicted {evicted} expired cached images")
+        except Exception:
+            logger.exception("Expired session purge failed")
+        await asyncio.sleep(3600)
+
+@lru_cache(maxsize=1)
+def get_local_ip() -> str:
+    """Resolve the local IP address once; health probes then reuse the cached value"""
+    try:
+        hostname = socket.gethostname()
+        return socket.gethostbyname(hostname)
+    except Exception:
+        return "unknown"
+
+@app.on_event("startup")
+def resolve_local_ip():
+    """Warm the local IP cache so the first health check does not pay for DNS"""
+    get_local_ip()
+
+@app.on_event("startup")
+async def schedule_session_cleanup():
+    """Start the expired session cleanup loop if a TTL is configured"""
+    # The event loop only keeps a weak reference to tasks, so hold on to it here
+    app.state.session_cleanup = None
+    if SESSION_TTL_HOURS:
+        app.state.session_cleanup = asyncio.create_task(purge_expired_sessions(float(SESSION_TTL_HOURS)))
+
+@app.on_event("shutdown")
+async def stop_session_cleanup():
+    """Cancel the expired session cleanup loop"""
+    task = getattr(app.state, "session_cleanup", None)
+    if task is not None:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+@app.on_event("shutdown")
+def flush_session_state():
+    """Persist any session state changes still waiting on the debounce timer"""
+    session_store.flush()
+
+@app.on_event("shutdown")
+async def close_street_view_clients():
+    """Close the pooled Street View connections"""
+    await close_shared_clients()
+
 @app.get("/")
 async def root():
     """API information endpoint"""
@@ -60,10 +127,12 @@ async def root():
         "status": "healthy",
         "endpoints": {
             "process_streetview": "POST /process-streetview",
+            "status": "GET /status/{session_id}",
             "health": "GET /health",
             "docs": "GET /docs",
             "download": "GET /download/{session_id}/{image_number}",
-            "session_info": "GET /sessions/{session_id}"
+            "session_info": "GET /sessions/{session_id}",
+            "delete_session": "DELETE /sessions/{session_id}"
         },
         "usage": {
             "example_request": {
@@ -72,6 +141,11 @@ async def root():
                 "angles": [0, 90, 180, 270]
             },
             "example_response": {
+                "session_id": "uuid",
+                "status": "queued",
+                "status_url": "/status/uuid"
+            },
+            "example_status_response": {
                 "session_id": "uuid",
                 "status": "completed",
                 "results": {
@@ -82,7 +156,7 @@ async def root():
                             "filepath": "path/to/image",
                             "success": True,
                             "ai_processed": True,
-                            "base64_encoded": "base64_string"
+                            "download_url": "/download/uuid/1"
                         }
                     ]
                 }
@@ -93,13 +167,7 @@ async def root():
 @app.get("/health")
 async def health_check():
     """Detailed health check"""
-    import socket
-    try:
-        # Get local IP address
-        hostname = socket.gethostname()
-        local_ip = socket.gethostbyname(hostname)
-    except:
-        local_ip = "unknown"
+    local_ip = get_local_ip()
     
     return {
         "status": "healthy",
@@ -110,197 +178,147 @@ async def health_check():
         "public_url": f"http://{local_ip}:{os.environ.get('PORT', 8000)}"
     }
 
-@app.post("/process-streetview")
-async def process_streetview(request: ProcessRequest):
+async def run_streetview_pipeline(session_id: str, address: str, prompt: str, angles: List[int]) -> None:
     """
-    Process Street View images with AI
+    Run the Street View + AI pipeline for a session and record the outcome in the session store.
     
-    - **address**: The address to get Street View images for
-    - **prompt**: AI editing prompt for the first image
-    - **angles**: List of angles to capture (default: [0, 90, 180, 270])
+    Executed as a background task so the request that queued it returns immediately.
+    The Street View requests run on the event loop; the blocking AI call runs on a thread.
     """
+    session_dir = session_store.session_dir(session_id)
+    session_store.update(session_id, status="processing")
+    
     try:
-        # Generate unique session ID
-        session_id = str(uuid.uuid4())
-        session_dir = f"output/{session_id}"
-        os.makedirs(session_dir, exist_ok=True)
-        
-        logger.info(f"Processing session {session_id} for address: {request.address}")
-        
         # Step 1: Get Street View images at multiple angles
-        print(f"🗺️  Getting Street View images for: {request.address}")
-        print(f"📐 Angles: {request.angles}")
+        print(f"🗺️  Getting Street View images for: {address}")
+        print(f"📐 Angles: {angles}")
         
-        street_view_results = street_view_service.get_street_view_at_degrees(
-            request.address, 
-            request.angles, 
-            '1024x768'
+        # Generate filenames with numbers (1,2,3,4 for Street View images); images are
+        # streamed straight to these files as they download
+        filepaths = [f"{session_dir}/{i + 1}.jpg" for i in range(len(angles))]
+        
+        street_view_batch = await street_view_service.get_street_view_batch(
+            address, 
+            angles, 
+            '1024x768',
+            out_paths=filepaths
         )
         
-        # Save images and collect results
+        # Collect results, reading the batch columns directly
         saved_images = []
-        for i, result in enumerate(street_view_results):
-            if result['success']:
-                # Generate filename with number (1,2,3,4 for Street View images)
-                image_number = i + 1
-                filename = f"{image_number}.jpg"
-                filepath = f"{session_dir}/{filename}"
-                
-                # Save the image
-                with open(filepath, 'wb') as f:
-                    f.write(result['imageBuffer'])
+        for i, angle in enumerate(angles):
+            if street_view_batch.success[i]:
+                filepath = street_view_batch.paths[i]
+                session_store.add_file(session_id, os.path.basename(filepath))
                 
                 image_data = {
-                    'angle': request.angles[i],
+                    'angle': angle,
                     'filepath': filepath,
-                    'url': result['url'],
+                    'url': street_view_batch.urls[i],
                     'success': True
                 }
                 
                 saved_images.append(image_data)
-                
-                print(f"✅ {request.angles[i]}°: Saved to {filepath}")
             else:
-                print(f"❌ {request.angles[i]}°: {result['error']}")
+                print(f"❌ {angle}°: {street_view_batch.errors[i]}")
                 saved_images.append({
-                    'angle': request.angles[i],
+                    'angle': angle,
                     'success': False,
-                    'error': result['error']
+                    'error': street_view_batch.errors[i]
                 })
         
+        for image in saved_images:
+            if image['success']:
+                print(f"✅ {image['angle']}°: Saved to {image['filepath']}")
+        
         # Step 2: Process the first successful image with AI
         successful_images = [img for img in saved_images if img['success']]
         
         if not successful_images:
-            raise HTTPException(status_code=400, detail="No Street View images were captured successfully")
+            raise Exception("No Street View images were captured successfully")
         
         # Use the first successful image for AI processing
         selected_image = successful_images[0]
         print(f"\n🎯 Selected image for AI processing: {selected_image['angle']}°")
         
-        # Process with AI
-        print(f"🤖 Processing image with AI: {request.prompt}")
-        ai_processed_path = process_image_with_prompt(selected_image['filepath'], request.prompt)
+        # Process with AI, saving straight into the session directory as 1.jpg (replacing the original)
+        print(f"🤖 Processing image with AI: {prompt}")
+        ai_processed_path = await asyncio.to_thread(
+            process_image_with_prompt,
+            selected_image['filepath'],
+            prompt,
+            out_path=f"{session_dir}/1.jpg"
+        )
+        session_store.add_file(session_id, "1.jpg")
         print(f"✅ AI processing complete: {ai_processed_path}")
-        
-        # Copy AI processed image to session directory as 1.jpg (replacing the original)
-        ai_session_path = f"{session_dir}/1.jpg"
-        shutil.copy2(ai_processed_path, ai_session_path)
 
-        base64_encoded_images = []
-        for i in range(1, 5):
-            image_path = f"{session_dir}/{i}.jpg"
-            if os.path.exists(image_path):
-                base64_encoded_images.append(encode_image_to_base64(image_path))
-            else:
-                base64_encoded_images.append(None)
-        
-        # Return results
-        return {
-            "session_id": session_id,
-            "status": "completed",
-            "address": request.address,
-            "prompt": request.prompt,
-            "results": {
+        session_store.update(
+            session_id,
+            status="completed",
+            results={
                 "images": [
                     {
                         "number": i + 1,
                         "angle": img['angle'],
-                        "filepath": img['filepath'],
+                        "filepath": img.get('filepath'),
                         "success": img['success'],
                         "ai_processed": i == 0,  # First image is AI processed
-                        "base64_encoded": base64_encoded_images[i]
+                        # Images are served from disk by /download rather than inlined
+                        "download_url": f"/download/{session_id}/{i + 1}" if img['success'] else None
                     } for i, img in enumerate(saved_images)
                 ],
                 "total_captured": len(successful_images)
             }
-        }
-        
-    except Exception as e:
-        logger.error(f"Error processing streetview: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Processing failed: {str(e)}")
-
-@app.get("/download/{session_id}/{image_number}")
-async def download_image(session_id: str, image_number: str):
-    """
-    Download a specific image from a processing session
-    
-    - **session_id**: The session ID from processing
-    - **image_number**: Image number (1, 2, 3, 4) - where 1 is AI processed
-    """
-    try:
-        # Construct file path
-        file_path = f"output/{session_id}/{image_number}.jpg"
-        
-        if not os.path.exists(file_path):
-            raise HTTPException(status_code=404, detail=f"Image not found: {image_number}")
-        
-        return FileResponse(
-            path=file_path,
-            filename=f"{image_number}_{session_id}.jpg",
-            media_type="image/jpeg"
         )
         
-    except HTTPException:
-        raise
     except Exception as e:
-        logger.error(f"Error downloading image: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Download failed: {str(e)}")
+        logger.error(f"Error processing streetview session {session_id}: {str(e)}")
+        session_store.update(
+            session_id,
+            status="failed",
+            error=f"Processing failed: {str(e)}"
+        )
 
-@app.get("/sessions/{session_id}")
-async def get_session_info(session_id: str):
+@app.post("/process-streetview")
+async def process_streetview(request: ProcessRequest, background_tasks: BackgroundTasks):
     """
-    Get information about a processing session
+    Queue Street View images for AI processing
+    
+    - **address**: The address to get Street View images for
+    - **prompt**: AI editing prompt for the first image
+    - **angles**: List of angles to capture (default: [0, 90, 180, 270])
     
-    - **session_id**: The session ID to query
+    Returns immediately with a session ID; poll `GET /status/{session_id}` for the result.
     """
     try:
-        session_dir = f"output/{session_id}"
+        # Generate unique session ID
+        session_id = str(uuid.uuid4())
         
-        if not os.path.exists(session_dir):
-            raise HTTPException(status_code=404, detail="Session not found")
+        logger.info(f"Queueing session {session_id} for address: {request.address}")
         
-        # List all files in session directory
-        files = []
-        for filename in os.listdir(session_dir):
-            if filename.endswith('.jpg'):
-                files.append(filename)
+        session_store.create(
+            session_id,
+            status="queued",
+            address=request.address,
+            prompt=request.prompt
+        )
+        background_tasks.add_task(
+            run_streetview_pipeline,
+            session_id,
+            request.address,
+            request.prompt,
+            request.angles
+        )
         
         return {
             "session_id": session_id,
-            "files_available": files,
-            "session_dir": session_dir
+            "status": "queued",
+            "status_url": f"/status/{session_id}"
         }
         
-    except HTTPException:
-        raise
     except Exception as e:
-        logger.error(f"Error getting session info: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Failed to get session info: {str(e)}")
-
-@app.delete("/sessions/{session_id}")
-async def delete_session(session_id: str):
-    """
-    Delete a processing session and all its files
-    
-    - **session_id**: The session ID to delete
-    """
-    try:
-        session_dir = f"output/{session_id}"
-        
-        if not os.path.exists(session_dir):
-            raise HTTPException(status_code=404, detail="Session not found")
-        
-        # Remove the entire session directory
-        shutil.rmtree(session_dir)
-        
-        return {"message": f"Session {session_id} deleted successfully"}
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error deleting session: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Failed to delete session: {str(e)}")
+        logger.error(f"Error queueing streetview: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Processing failed: {str(e)}")
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,18 @@
+_env_loaded = False
+
+
+def ensure_env() -> None:
+    """
+    Load environment variables from the .env file, once per process.
+
+    Every module that reads API keys calls this, so .env is parsed on first use
+    instead of once per importing module. Variables already set in the environment
+    take precedence over the file.
+    """
+    global _env_loaded
+    if _env_loaded:
+        return
+
+    from dotenv import load_dotenv
+    load_dotenv()
+    _env_loaded = True
@@ -20,35 +20,28 @@ def get_street_view_360(location: str, degrees: list = [0, 90, 180, 270], size:
     print(f"🗺️  Getting Street View images for: {location}")
     print(f"📐 Angles: {degrees}")
     
+    # Ensure output directory exists
+    os.makedirs("output", exist_ok=True)
+    
+    # Generate filenames with numbers (1,2,3,4 for Street View images); start from 1,
+    # AI will overwrite 1 later. Images are streamed straight to these files
+    filepaths = [f"output/{i + 1}.jpg" for i in range(len(degrees))]
+    
     service = StreetViewService()
-    results = service.get_street_view_at_degrees(location, degrees, size)
+    results = service.get_street_view_at_degrees(location, degrees, size, out_paths=filepaths)
     
-    # Save images and collect results
+    # Collect results
     saved_images = []
     for i, result in enumerate(results):
         if result['success']:
-            # Generate filename with number (1,2,3,4 for Street View images)
-            image_number = i + 1  # Start from 1, AI will overwrite 1 later
-            filename = f"{image_number}.jpg"
-            filepath = f"output/{filename}"
-            
-            # Ensure output directory exists
-            os.makedirs("output", exist_ok=True)
-            
-            # Save the image
-            with open(filepath, 'wb') as f:
-                f.write(result['imageBuffer'])
-            
             image_data = {
                 'angle': degrees[i],
-                'filepath': filepath,
+                'filepath': result['path'],
                 'url': result['url'],
                 'success': True
             }
             
             saved_images.append(image_data)
-            
-            print(f"✅ {degrees[i]}°: Saved to {filepath}")
         else:
             print(f"❌ {degrees[i]}°: {result['error']}")
             saved_images.append({
@@ -57,6 +50,10 @@ def get_street_view_360(location: str, degrees: list = [0, 90, 180, 270], size:
                 'error': result['error']
             })
     
+    for image in saved_images:
+        if image['success']:
+            print(f"✅ {image['angle']}°: Saved to {image['filepath']}")
+    
     return {
         'location': location,
         'images': saved_images,
@@ -0,0 +1,145 @@
+from fastapi import APIRouter, HTTPException, Path
+from fastapi.responses import FileResponse
+import shutil
+import asyncio
+import logging
+import uuid
+from services.session_store import SessionStore
+
+logger = logging.getLogger(__name__)
+
+session_router = APIRouter()
+
+# In-memory registry of sessions and their processing status, shared by every app
+# that includes this router
+session_store = SessionStore("output")
+
+def validate_session_id(session_id: str) -> None:
+    """
+    Reject IDs that cannot name a session before they reach the registry or disk.
+    
+    Only canonical UUID strings (as generated by `str(uuid.uuid4())`) are accepted,
+    which also keeps path separators and other traversal tricks out of file paths.
+    """
+    try:
+        valid = str(uuid.UUID(session_id)) == session_id
+    except ValueError:
+        valid = False
+    
+    if not valid:
+        raise HTTPException(status_code=404, detail="Session not found")
+
+@session_router.get("/status/{session_id}")
+async def get_status(session_id: str):
+    """
+    Get the processing status of a session
+    
+    - **session_id**: The session ID returned by `POST /process-streetview`
+    
+    Status is one of `queued`, `processing`, `completed` or `failed`.
+    Completed sessions include their `results`; failed ones include an `error`.
+    """
+    validate_session_id(session_id)
+    
+    session = session_store.get(session_id)
+    
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    
+    response = {"session_id": session_id, "status": session["status"]}
+    for key in ("address", "prompt", "results", "error"):
+        if key in session:
+            response[key] = session[key]
+    
+    return response
+
+@session_router.get("/download/{session_id}/{image_number}")
+async def download_image(session_id: str, image_number: int = Path(..., ge=1)):
+    """
+    Download a specific image from a processing session
+    
+    - **session_id**: The session ID from processing
+    - **image_number**: Image number (1, 2, 3, 4) - where 1 is AI processed
+    """
+    validate_session_id(session_id)
+    
+    try:
+        filename = f"{image_number}.jpg"
+        
+        if not session_store.has_file(session_id, filename):
+            raise HTTPException(status_code=404, detail=f"Image not found: {image_number}")
+        
+        return FileResponse(
+            path=f"{session_store.session_dir(session_id)}/{filename}",
+            filename=f"{image_number}_{session_id}.jpg",
+            media_type="image/jpeg"
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error downloading image: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Download failed: {str(e)}")
+
+@session_router.get("/sessions/{session_id}")
+async def get_session_info(session_id: str):
+    """
+    Get information about a processing session
+    
+    - **session_id**: The session ID to query
+    """
+    validate_session_id(session_id)
+    
+    try:
+        session = session_store.get(session_id)
+        
+        if session is None:
+            raise HTTPException(status_code=404, detail="Session not found")
+        
+        return {
+            "session_id": session_id,
+            "files_available": session_store.list_files(session_id),
+            "session_dir": session["dir"]
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting session info: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to get session info: {str(e)}")
+
+@session_router.delete("/sessions/{session_id}")
+async def delete_session(session_id: str):
+    """
+    Delete a processing session and all its files
+    
+    - **session_id**: The session ID to delete
+    
+    Sessions that are still queued or processing cannot be deleted (409).
+    Cached copies of the session's images under `output/cache` are kept for reuse by
+    later sessions; they are evicted once older than `SESSION_TTL_HOURS`.
+    """
+    validate_session_id(session_id)
+    
+    try:
+        session = session_store.get(session_id)
+        
+        if session is None:
+            raise HTTPException(status_code=404, detail="Session not found")
+        
+        # The background pipeline is still writing into the session directory
+        if session_store.is_active(session):
+            raise HTTPException(status_code=409, detail=f"Session is {session['status']}; try again once it has finished")
+        
+        session_store.remove(session_id)
+        
+        # Remove the entire session directory without blocking the event loop
+        await asyncio.to_thread(shutil.rmtree, session["dir"])
+        
+        return {"message": f"Session {session_id} deleted successfully"}
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error deleting session: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to delete session: {str(e)}")
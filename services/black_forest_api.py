@@ -1,22 +1,38 @@
 import os
-import requests
-import base64
-import time
-from PIL import Image
-from io import BytesIO
+import orjson
+import logging
 from typing import Optional
-from dotenv import load_dotenv
+import httpx
+from config import ensure_env
+from services.http_session import poll_for_result as _poll_for_result
+from services.result_cache import ResultCache
+from services.file_io import write_chunks, encode_image
 
 # Load environment variables from .env file
-load_dotenv()
+ensure_env()
 
+# Resolved once instead of on every call; the poll loop passes the key on each request
+_BFL_KEY = os.environ.get("BFL_API_KEY")
 
-def encode_image(image_path: str) -> str:
-    """Encode an image file to base64 string."""
-    image = Image.open(image_path)
-    buffered = BytesIO()
-    image.save(buffered, format="JPEG")
-    return base64.b64encode(buffered.getvalue()).decode()
+logger = logging.getLogger(__name__)
+
+# Earlier results, reused when the same image and prompt are submitted again
+result_cache = ResultCache()
+
+# Shared by every call so the upload, the poll requests and the result download reuse
+# one warm connection. Over HTTP/2 the poll requests are multiplexed on it with
+# HPACK-compressed headers. The API key is sent per request so it never reaches the
+# result delivery host.
+_CLIENT = httpx.Client(
+    timeout=httpx.Timeout(60.0, connect=10.0),
+    transport=httpx.HTTPTransport(
+        http2=True,
+        limits=httpx.Limits(max_keepalive_connections=8, max_connections=16),
+        # Retry failed connection attempts; poll_for_result backs off on error responses
+        retries=3
+    ),
+    headers={'accept': 'application/json'}
+)
 
 
 def call_black_forest_api(image_path: str, prompt: str, api_key: Optional[str] = None) -> dict:
@@ -32,7 +48,7 @@ def call_black_forest_api(image_path: str, prompt: str, api_key: Optional[str] =
         Dictionary containing the API response
     """
     if api_key is None:
-        api_key = os.environ.get("BFL_API_KEY")
+        api_key = _BFL_KEY
     
     if not api_key:
         raise ValueError("API key is required. Set BFL_API_KEY environment variable or pass api_key parameter.")
@@ -41,17 +57,18 @@ def call_black_forest_api(image_path: str, prompt: str, api_key: Optional[str] =
     img_str = encode_image(image_path)
     
     # Make the API request
-    response = requests.post(
+    response = _CLIENT.post(
         'https://api.bfl.ai/v1/flux-kontext-pro',
         headers={
-            'accept': 'application/json',
             'x-key': api_key,
             'Content-Type': 'application/json',
         },
-        json={
+        # The API only accepts JSON; orjson serializes the multi-MB base64 string much
+        # faster than the stdlib encoder behind json=
+        content=orjson.dumps({
             'prompt': prompt,
             'input_image': img_str,
-        },
+        }),
     )
     
     if response.status_code != 200:
@@ -74,48 +91,12 @@ def poll_for_result(polling_url: str, request_id: str, api_key: Optional[str] =
         Dictionary containing the final result
     """
     if api_key is None:
-        api_key = os.environ.get("BFL_API_KEY")
+        api_key = _BFL_KEY
     
     if not api_key:
         raise ValueError("API key is required. Set BFL_API_KEY environment variable or pass api_key parameter.")
     
-    start_time = time.time()
-    
-    while time.time() - start_time < max_wait_time:
-        try:
-            response = requests.get(
-                polling_url,
-                headers={
-                    'accept': 'application/json',
-                    'x-key': api_key,
-                },
-                params={'id': request_id}
-            )
-            
-            if response.status_code != 200:
-                raise Exception(f"Polling request failed with status {response.status_code}: {response.text}")
-            
-            result = response.json()
-            
-            # Check if the job is complete
-            if result.get("status") == "Ready":
-                print(f"Image ready: {result.get('result', {}).get('sample', 'No sample URL provided')}")
-                return result
-            elif result.get("status") in ["Error", "Failed"]:
-                raise Exception(f"Image editing failed: {result}")
-            
-            # Show polling status
-            elapsed = int(time.time() - start_time)
-            print(f"Polling... (elapsed: {elapsed}s, status: {result.get('status', 'unknown')})")
-            
-            # Wait before polling again
-            time.sleep(0.5)
-            
-        except Exception as e:
-            print(f"Polling error: {e}")
-            time.sleep(1)
-    
-    raise TimeoutError(f"Image editing did not complete within {max_wait_time} seconds")
+    return _poll_for_result(_CLIENT, polling_url, request_id, {'x-key': api_key}, max_wait_time)
 
 
 def edit_image(image_path: str, prompt: str, api_key: Optional[str] = None, wait_for_result: bool = True) -> dict:
@@ -150,13 +131,14 @@ def edit_image(image_path: str, prompt: str, api_key: Optional[str] = None, wait
     return result
 
 
-def process_image_with_prompt(image_path: str, prompt: str) -> str:
+def process_image_with_prompt(image_path: str, prompt: str, out_path: Optional[str] = None) -> str:
     """
     Process an image with a specific prompt and return the output path.
     
     Args:
         image_path: Path to the input image
         prompt: The editing prompt
+        out_path: Where to save the edited image (default: 'output/1.jpg')
     
     Returns:
         Path to the saved edited image
@@ -165,28 +147,32 @@ def process_image_with_prompt(image_path: str, prompt: str) -> str:
         if not os.path.exists(image_path):
             raise FileNotFoundError(f"Image file '{image_path}' not found.")
         
+        # Save as 1.jpg in the output folder unless told otherwise
+        output_path = out_path or "output/1.jpg"
+        
+        # Identical inputs produce the cached result without calling the API
+        cache_key = result_cache.key_for(image_path, prompt)
+        if result_cache.fetch(cache_key, output_path):
+            print(f"Using cached result for '{image_path}': '{output_path}'")
+            return output_path
+        
         # Call the API
         result = edit_image(image_path, prompt)
         
         # Save the result image
         if "result" in result and "sample" in result["result"]:
             image_url = result["result"]["sample"]
-            print(f"Downloading image from: {image_url}")
+            logger.debug("Downloading image from: %s", image_url)
+            
+            # Stream the image to disk as it arrives rather than buffering it in memory
+            with _CLIENT.stream('GET', image_url) as img_response:
+                if img_response.status_code != 200:
+                    raise Exception(f"Failed to download image: {img_response.status_code}")
+                write_chunks(output_path, img_response.iter_bytes(chunk_size=65536))
             
-            # Download the image
-            img_response = requests.get(image_url)
-            if img_response.status_code == 200:
-                # Generate filename as 1.jpg for AI image
-                filename = "1.jpg"
-                
-                # Save the image to output folder
-                output_path = f"output/{filename}"
-                with open(output_path, "wb") as f:
-                    f.write(img_response.content)
-                print(f"Edited image saved as '{output_path}'")
-                return output_path
-            else:
-                raise Exception(f"Failed to download image: {img_response.status_code}")
+            result_cache.store(cache_key, output_path)
+            print(f"Edited image saved as '{output_path}'")
+            return output_path
         else:
             raise Exception("No image URL found in the result")
             
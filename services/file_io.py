@@ -0,0 +1,151 @@
+import os
+import uuid
+import base64
+import shutil
+from functools import lru_cache
+from io import BytesIO
+from PIL import Image
+from typing import AsyncIterable, Iterable, Tuple
+
+# First bytes of every JPEG file (SOI marker followed by the next marker's prefix)
+JPEG_MAGIC = b'\xff\xd8\xff'
+
+
+def encode_image(image_path: str) -> str:
+    """Encode an image file to a base64 JPEG string."""
+    with open(image_path, 'rb') as f:
+        return encode_image_bytes(f.read())
+
+
+def encode_image_cached(image_path: str) -> str:
+    """
+    Encode an image file like `encode_image`, reusing the result while the file is unchanged.
+
+    Only worth it where the same inputs are encoded repeatedly, as in the multi-step
+    merge pipelines (e.g. one person source for many scenes). The key includes the
+    inode, so a file swapped in by os.replace with the same size and mtime is read again.
+    """
+    stat = os.stat(image_path)
+    return _encode_file(image_path, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+def encode_image_bytes(image_bytes: bytes) -> str:
+    """Encode in-memory image bytes to a base64 JPEG string."""
+    # JPEG input is uploaded as-is; decoding and re-encoding it only costs time and quality
+    if not image_bytes.startswith(JPEG_MAGIC):
+        buffered = BytesIO()
+        Image.open(BytesIO(image_bytes)).convert('RGB').save(buffered, format="JPEG", quality=90, optimize=True)
+        # A view of the buffer; getvalue() would copy the whole encoded image
+        image_bytes = buffered.getbuffer()
+    return base64.b64encode(image_bytes).decode('ascii')
+
+
+@lru_cache(maxsize=16)
+def _encode_file(image_path: str, ino: int, mtime_ns: int, size: int) -> str:
+    """Read and base64-encode an image file; memoized by `encode_image_cached`."""
+    return encode_image(image_path)
+
+
+def write_bytes(path: str, data: bytes) -> None:
+    """
+    Write bytes to a file with raw os-level calls, bypassing Python's buffered writer.
+
+    The data goes to a temporary file that is then renamed over `path`, so an existing
+    file is replaced rather than truncated. This keeps hard links to the old file
+    (e.g. cached results) intact.
+
+    Args:
+        path: Destination path
+        data: Bytes to write
+    """
+    write_chunks(path, (data,))
+
+
+def write_chunks(path: str, chunks: Iterable[bytes]) -> None:
+    """
+    Write a stream of byte chunks to a file as they arrive, replacing it atomically.
+
+    Lets a download be written while it is still being received instead of being
+    held in memory in full first. See `write_bytes` for the replacement semantics.
+
+    Args:
+        path: Destination path
+        chunks: Byte chunks to write, in order
+    """
+    fd, tmp_path = _open_temp(path)
+    try:
+        for chunk in chunks:
+            _write_all(fd, chunk)
+    except BaseException:
+        _discard_temp(fd, tmp_path)
+        raise
+    _commit_temp(fd, tmp_path, path)
+
+
+async def write_chunks_async(path: str, chunks: AsyncIterable[bytes]) -> None:
+    """
+    Async counterpart of `write_chunks`, for chunks arriving from an async HTTP stream.
+
+    Each os.write only copies a chunk into the page cache and does not wait for the
+    disk, so the writes run on the event loop rather than on a thread per chunk.
+
+    Args:
+        path: Destination path
+        chunks: Byte chunks to write, in order
+    """
+    fd, tmp_path = _open_temp(path)
+    try:
+        async for chunk in chunks:
+            _write_all(fd, chunk)
+    except BaseException:
+        _discard_temp(fd, tmp_path)
+        raise
+    _commit_temp(fd, tmp_path, path)
+
+
+def _open_temp(path: str) -> Tuple[int, str]:
+    """Create the temporary file a write to `path` goes through; returns its descriptor and path."""
+    # Unique name so concurrent writers to the same path (e.g. two sessions caching the
+    # same result) cannot share or remove each other's temporary file
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    return os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644), tmp_path
+
+
+def _write_all(fd: int, chunk: bytes) -> None:
+    """Write a whole chunk, looping over short writes."""
+    view = memoryview(chunk)
+    while view:
+        written = os.write(fd, view)
+        view = view[written:]
+
+
+def _commit_temp(fd: int, tmp_path: str, path: str) -> None:
+    """Close a fully written temporary file and rename it over `path`."""
+    os.close(fd)
+    os.replace(tmp_path, path)
+
+
+def _discard_temp(fd: int, tmp_path: str) -> None:
+    """Close and delete a temporary file, so no partial download is left behind."""
+    os.close(fd)
+    os.remove(tmp_path)
+
+
+def link_or_copy(src: str, dst: str) -> None:
+    """
+    Make `dst` share `src`'s data through a hard link, copying only if linking fails.
+
+    Identical files then share one inode instead of taking a full copy each. Linking
+    is not possible across filesystems or on some network mounts, in which case the
+    file is copied. `dst` is replaced atomically, never truncated in place.
+    """
+    # Unique name so concurrent calls for the same destination cannot collide
+    tmp_path = f"{dst}.{uuid.uuid4().hex}.tmp"
+    try:
+        os.link(src, tmp_path)
+    except OSError:
+        shutil.copy2(src, tmp_path)
+    os.replace(tmp_path, dst)
+    # rename() does nothing if both names already link to the same file
+    if os.path.lexists(tmp_path):
+        os.remove(tmp_path)
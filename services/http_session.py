@@ -0,0 +1,146 @@
+import time
+import random
+import logging
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Optional, Dict, Any, Union
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Range, in seconds, of the `wait` sent with long-poll requests
+LONG_POLL_WAIT = (25.0, 30.0)
+
+
+def create_session(retry: Retry, pool_connections: int = 4, pool_maxsize: int = 16,
+                   headers: Optional[Dict[str, str]] = None) -> requests.Session:
+    """
+    Create a requests Session that keeps HTTPS connections alive and retries transient failures.
+
+    Reusing one session lets urllib3's connection pool reuse warm TCP+TLS connections
+    instead of performing a new handshake for every request.
+
+    Args:
+        retry: Retry policy applied to every request on the session
+        pool_connections: Number of per-host connection pools to keep (default: 4)
+        pool_maxsize: Maximum connections kept per host (default: 16)
+        headers: Default headers sent with every request
+
+    Returns:
+        The configured session
+    """
+    session = requests.Session()
+    session.mount('https://', HTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        max_retries=retry
+    ))
+    if headers:
+        session.headers.update(headers)
+    return session
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """
+    Return an exponential backoff delay with full jitter.
+
+    The delay is drawn uniformly from [0, min(cap, base * 2**attempt)], so clients
+    polling the same service spread out instead of retrying in lockstep.
+
+    Args:
+        attempt: Number of consecutive attempts so far, starting at 0
+        base: Upper bound of the first delay in seconds
+        cap: Largest upper bound any delay may have in seconds
+
+    Returns:
+        Seconds to wait before the next attempt
+    """
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def poll_for_result(client: Union[requests.Session, httpx.Client], polling_url: str, request_id: str,
+                    headers: Dict[str, str], max_wait_time: int = 300) -> Dict[str, Any]:
+    """
+    Poll the Black Forest API for the result of an image editing request.
+
+    Args:
+        client: Session or client the polls are sent on
+        polling_url: URL returned from the initial API call
+        request_id: Request ID from the initial API call
+        headers: Headers sent with every poll, including the API key
+        max_wait_time: Maximum time to wait in seconds (default: 5 minutes)
+
+    Returns:
+        Dictionary containing the final result
+    """
+    start_time = time.time()
+    # Consecutive polls that saw the same status, and consecutive failed polls
+    attempt = 0
+    err_attempt = 0
+    last_status = None
+    # When the polling status was last logged
+    last_logged = 0.0
+    # Ask the server to hold each poll open until the status changes; switched off
+    # if the server rejects the `wait` parameter
+    long_poll = True
+    
+    # De-synchronize pipelines that submitted at the same moment
+    time.sleep(random.uniform(0, 0.25))
+    
+    while time.time() - start_time < max_wait_time:
+        try:
+            params = {'id': request_id}
+            if long_poll:
+                # Jittered so many clients' long polls do not expire in lockstep
+                params['wait'] = round(random.uniform(*LONG_POLL_WAIT), 1)
+            
+            request_started = time.time()
+            response = client.get(
+                polling_url,
+                headers=headers,
+                params=params,
+                timeout=LONG_POLL_WAIT[1] + 5
+            )
+            held = time.time() - request_started
+            
+            if long_poll and 400 <= response.status_code < 500 and response.status_code != 429:
+                logger.info("Long polling not supported (status %s), falling back to short polling", response.status_code)
+                long_poll = False
+                continue
+            
+            if response.status_code != 200:
+                raise Exception(f"Polling request failed with status {response.status_code}: {response.text}")
+            
+            result = response.json()
+            
+            # Check if the job is complete
+            if result.get("status") == "Ready":
+                print(f"Image ready: {result.get('result', {}).get('sample', 'No sample URL provided')}")
+                return result
+            elif result.get("status") in ["Error", "Failed"]:
+                raise Exception(f"Image editing failed: {result}")
+            
+            # Log the polling status when it changes, otherwise at most every 5 seconds
+            status = result.get("status")
+            elapsed = time.time() - start_time
+            if status != last_status or elapsed - last_logged >= 5:
+                logger.info("Polling... (elapsed: %ds, status: %s)", elapsed, status or 'unknown')
+                last_logged = elapsed
+            
+            # Back off while the status stays the same; start over once it moves on
+            attempt = 0 if status != last_status else attempt + 1
+            last_status = status
+            err_attempt = 0
+            
+            # A server that honours `wait` already held the request open, so poll
+            # again right away. Otherwise it answered immediately, so back off
+            if not (long_poll and held >= params['wait'] / 2):
+                time.sleep(backoff_delay(attempt, base=0.5, cap=5.0))
+            
+        except Exception as e:
+            logger.warning("Polling error: %s", e)
+            time.sleep(backoff_delay(err_attempt, base=1.0, cap=30.0))
+            err_attempt += 1
+    
+    raise TimeoutError(f"Image editing did not complete within {max_wait_time} seconds")
@@ -0,0 +1,148 @@
+import os
+import time
+from typing import Optional
+from blake3 import blake3
+from services.file_io import write_bytes, link_or_copy
+
+
+class ResultCache:
+    def __init__(self, cache_dir: str = "output/cache", max_age: Optional[float] = None):
+        """
+        Initialize the content-addressed cache of AI results.
+
+        Results are keyed by a BLAKE3 hash of the input image bytes and the prompt, so
+        resubmitting identical inputs reuses the earlier output instead of running
+        the model again. Cached files are shared with session directories through
+        hard links (copies where linking is not supported) and must never be
+        modified in place.
+
+        Args:
+            cache_dir: Directory holding the cached result images (default: 'output/cache')
+            max_age: Seconds after which a cached result is treated as a miss and
+                replaced by the next store. If None, results never expire
+        """
+        self.cache_dir = cache_dir
+        self.max_age = max_age
+
+    def key_for(self, image_path: str, prompt: str) -> str:
+        """
+        Compute the cache key for an image and prompt pair.
+
+        Args:
+            image_path: Path to the input image
+            prompt: The editing prompt
+
+        Returns:
+            Hex digest of the image bytes and the prompt
+        """
+        with open(image_path, 'rb') as f:
+            return self.key_for_bytes(f.read(), prompt)
+
+    def key_for_bytes(self, image_bytes: bytes, prompt: str) -> str:
+        """Compute the cache key for in-memory image bytes and a prompt."""
+        # Uploads are several MB; let BLAKE3 spread large inputs across cores
+        image_digest = blake3(image_bytes, max_threads=blake3.AUTO).hexdigest(length=16)
+        prompt_digest = blake3(prompt.encode()).hexdigest(length=16)
+        return f"{image_digest}_{prompt_digest}"
+
+    def key_for_url(self, url: str) -> str:
+        """Compute the cache key for a deterministic request URL."""
+        # Hashed rather than used as a file name: URLs are long and may carry API keys
+        return blake3(url.encode()).hexdigest(length=16)
+
+    def path_for(self, key: str) -> str:
+        """Return the path of the cached result for a key."""
+        return f"{self.cache_dir}/{key}.jpg"
+
+    def fetch(self, key: str, output_path: str) -> bool:
+        """
+        Link a cached result into place.
+
+        Args:
+            key: Cache key from `key_for`
+            output_path: Where the result should appear
+
+        Returns:
+            True on a cache hit, False otherwise
+        """
+        cached_path = self.path_for(key)
+        if self._expired(cached_path):
+            return False
+        try:
+            link_or_copy(cached_path, output_path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def load(self, key: str) -> Optional[bytes]:
+        """Return the cached result bytes for a key, or None on a cache miss."""
+        if self._expired(self.path_for(key)):
+            return None
+        try:
+            with open(self.path_for(key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def save(self, key: str, data: bytes) -> None:
+        """Add freshly generated result bytes to the cache."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        write_bytes(self.path_for(key), data)
+
+    def store(self, key: str, result_path: str) -> None:
+        """
+        Add a freshly generated result to the cache.
+
+        Args:
+            key: Cache key from `key_for`
+            result_path: Path of the generated image
+        """
+        cached_path = self.path_for(key)
+        if os.path.exists(cached_path) and not self._expired(cached_path):
+            return
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        link_or_copy(result_path, cached_path)
+
+    def purge_expired(self, max_age: float) -> int:
+        """
+        Delete cached results that have not been written for `max_age` seconds.
+
+        Without this the cache grows by one file per unique input forever. Copies
+        hard-linked into session directories are unaffected; only the cache's own
+        link is removed.
+
+        Args:
+            max_age: Maximum age in seconds of a cached result
+
+        Returns:
+            Number of deleted files
+        """
+        cutoff = time.time() - max_age
+        deleted = 0
+
+        try:
+            with os.scandir(self.cache_dir) as entries:
+                expired = [
+                    entry.path for entry in entries
+                    if entry.is_file(follow_symlinks=False) and entry.stat().st_mtime < cutoff
+                ]
+        except FileNotFoundError:
+            return deleted
+
+        for path in expired:
+            try:
+                os.remove(path)
+                deleted += 1
+            except FileNotFoundError:
+                pass
+        return deleted
+
+    def _expired(self, cached_path: str) -> bool:
+        """Check whether a cached file is older than `max_age`; missing files are left to the caller."""
+        if self.max_age is None:
+            return False
+        try:
+            return os.stat(cached_path).st_mtime < time.time() - self.max_age
+        except FileNotFoundError:
+            return False
@@ -0,0 +1,257 @@
+import os
+import json
+import time
+import shutil
+import threading
+from typing import Optional, Dict, Any, List, Tuple
+
+
+class SessionStore:
+    STATE_FILE = "state.jsonl"
+    # Sessions in these states are still being written and are never purged
+    ACTIVE_STATUSES = ("queued", "processing")
+
+    def __init__(self, root: str = "output", flush_delay: float = 0.1):
+        """
+        Initialize the in-process session registry.
+
+        Sessions are tracked in memory so request handlers can answer from a dict
+        lookup instead of stat-ing the session directory on every call. The disk is
+        only consulted on a cache miss (e.g. sessions created before a restart).
+
+        Field changes are persisted as an append-only log of deltas in each session's
+        state file. Changes made within `flush_delay` seconds of each other are
+        coalesced into a single write, made by one background flusher thread so the
+        event loop never waits on the disk.
+
+        Args:
+            root: Directory under which each session gets its own folder (default: 'output')
+            flush_delay: Debounce window in seconds for state writes (default: 0.1)
+        """
+        self.root = root
+        self.flush_delay = flush_delay
+        self._sessions: Dict[str, Dict[str, Any]] = {}
+        # Changed fields not yet written to disk, and when each session is due to be
+        # written. Every flush waits the same delay, so insertion order is due order
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._due: Dict[str, float] = {}
+        # Shared by the event loop, the flusher thread and the purge pass, which runs in
+        # a worker thread; the flusher waits on the condition for new or due writes
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._flusher: Optional[threading.Thread] = None
+        # Keeps appended deltas in the order they were recorded
+        self._write_lock = threading.Lock()
+
+    def session_dir(self, session_id: str) -> str:
+        """Return the directory holding a session's files."""
+        return f"{self.root}/{session_id}"
+
+    def create(self, session_id: str, **fields: Any) -> Dict[str, Any]:
+        """
+        Register a new session and create its directory.
+
+        Args:
+            session_id: The session ID
+            **fields: Initial session fields (e.g. status, address, prompt)
+
+        Returns:
+            The session record
+        """
+        session_dir = self.session_dir(session_id)
+        os.makedirs(session_dir, exist_ok=True)
+
+        session = {'dir': session_dir, 'files': set(), **fields}
+        with self._lock:
+            self._sessions[session_id] = session
+            self._schedule(session_id, fields)
+        return session
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a session, falling back to a disk scan on a cache miss.
+
+        Args:
+            session_id: The session ID
+
+        Returns:
+            The session record, or None if the session does not exist
+        """
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = self._load(session_id)
+        return session
+
+    def update(self, session_id: str, **fields: Any) -> None:
+        """
+        Merge fields into an existing session record and schedule them to be persisted.
+        
+        Does nothing if the session has been removed in the meantime.
+        """
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return
+            session.update(fields)
+            self._schedule(session_id, fields)
+
+    def add_file(self, session_id: str, filename: str) -> None:
+        """Record that a file has been written to the session directory, unless the session has been removed."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session['files'].add(filename)
+
+    def has_file(self, session_id: str, filename: str) -> bool:
+        """Check whether a session has produced the given file."""
+        session = self.get(session_id)
+        return session is not None and filename in session['files']
+
+    def list_files(self, session_id: str) -> List[str]:
+        """Return the sorted file names of a session."""
+        session = self.get(session_id)
+        return sorted(session['files']) if session else []
+
+    def is_active(self, session: Dict[str, Any]) -> bool:
+        """Check whether a session is still being written by its pipeline."""
+        return session.get('status') in self.ACTIVE_STATUSES
+
+    def remove(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Drop a session from the registry.
+
+        The session directory is left in place for the caller to delete.
+
+        Args:
+            session_id: The session ID
+
+        Returns:
+            The removed session record, or None if the session does not exist
+        """
+        session = self.get(session_id)
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            self._pending.pop(session_id, None)
+            self._due.pop(session_id, None)
+        return session
+
+    def purge_expired(self, max_age: float, keep: Tuple[str, ...] = ()) -> List[str]:
+        """
+        Delete sessions whose directory has not been modified for `max_age` seconds.
+
+        The root is listed with a single os.scandir pass, which returns entry types
+        without an extra stat per entry; only directories are considered.
+
+        Args:
+            max_age: Maximum session age in seconds
+            keep: Directory names under the root that are not sessions and must be kept
+
+        Returns:
+            IDs of the deleted sessions
+        """
+        cutoff = time.time() - max_age
+        purged = []
+
+        try:
+            with os.scandir(self.root) as entries:
+                expired = [
+                    entry for entry in entries
+                    if entry.is_dir(follow_symlinks=False) and entry.stat().st_mtime < cutoff
+                ]
+        except FileNotFoundError:
+            return purged
+
+        for entry in expired:
+            session = self._sessions.get(entry.name)
+            if entry.name in keep or (session is not None and self.is_active(session)):
+                continue
+
+            self.remove(entry.name)
+            shutil.rmtree(entry.path, ignore_errors=True)
+            purged.append(entry.name)
+
+        return purged
+
+    def flush(self, session_id: Optional[str] = None) -> None:
+        """
+        Write pending state changes to disk immediately.
+
+        Args:
+            session_id: Session to flush. If None, all sessions with pending changes are flushed
+        """
+        session_ids = [session_id] if session_id else list(self._pending)
+        for pending_id in session_ids:
+            self._write_pending(pending_id)
+
+    def _schedule(self, session_id: str, fields: Dict[str, Any]) -> None:
+        """Queue changed fields for the next debounced write. Caller must hold the lock."""
+        self._pending.setdefault(session_id, {}).update(fields)
+
+        if session_id not in self._due:
+            self._due[session_id] = time.monotonic() + self.flush_delay
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._run_flusher, name="session-flusher", daemon=True)
+                self._flusher.start()
+            self._wakeup.notify()
+
+    def _run_flusher(self) -> None:
+        """Write each session's pending changes once its debounce window has passed."""
+        while True:
+            with self._lock:
+                while not self._due:
+                    self._wakeup.wait()
+                session_id, due = next(iter(self._due.items()))
+                delay = due - time.monotonic()
+                if delay > 0:
+                    # Woken early by a new change or a flush; the head is re-checked
+                    self._wakeup.wait(delay)
+                    continue
+            self._write_pending(session_id)
+
+    def _write_pending(self, session_id: str) -> None:
+        """Append the coalesced field changes of a session to its state file."""
+        with self._write_lock:
+            with self._lock:
+                self._due.pop(session_id, None)
+                delta = self._pending.pop(session_id, None)
+            if not delta:
+                return
+
+            state_path = f"{self.session_dir(session_id)}/{self.STATE_FILE}"
+            try:
+                with open(state_path, 'a') as f:
+                    f.write(json.dumps(delta) + "\n")
+            except FileNotFoundError:
+                # Session directory was deleted before the write happened
+                pass
+
+    def _load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Rebuild a session record from its directory and cache it."""
+        session_dir = self.session_dir(session_id)
+
+        try:
+            with os.scandir(session_dir) as entries:
+                files = {entry.name for entry in entries if entry.name.endswith('.jpg')}
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+
+        # Replay persisted field changes; processing state is unknown without them
+        session = {'dir': session_dir, 'files': files, 'status': 'unknown'}
+        try:
+            with open(f"{session_dir}/{self.STATE_FILE}") as f:
+                for line in f:
+                    session.update(json.loads(line))
+        except (FileNotFoundError, ValueError):
+            pass
+
+        with self._lock:
+            if session_id in self._sessions:
+                return self._sessions[session_id]
+            # No pipeline survives a restart, so a session left active on disk never
+            # finishes; record it as failed so it can be deleted and purged
+            if self.is_active(session):
+                interrupted = {'status': 'failed', 'error': 'Processing was interrupted by a server restart'}
+                session.update(interrupted)
+                self._schedule(session_id, interrupted)
+            self._sessions[session_id] = session
+        return session
@@ -1,17 +1,39 @@
 import os
-import requests
 import time
-import base64
-from typing import Optional, Dict, Any, Tuple
+import logging
+import uuid
+import threading
+import orjson
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, Tuple, List, Final
 from PIL import Image
 from io import BytesIO
-from dotenv import load_dotenv
+from urllib3.util.retry import Retry
+from config import ensure_env
+from services.http_session import create_session, poll_for_result as _poll_for_result
+from services.result_cache import ResultCache
+from services.file_io import write_bytes, write_chunks, encode_image_cached, encode_image_bytes
 
-# Load environment variables
-load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Default prompts for the 3-step person swap workflow
+DEFAULT_ADD_PERSON_PROMPT: Final = "Add a realistic person to this scene in a natural pose. The person should be doing something interesting but believable. Keep the background, lighting, and environment exactly as they are. Only add the person, do not change anything else in the image."
+DEFAULT_COMPOSITE_PROMPT: Final = "Create a side-by-side comparison by placing the first image on the left and the second image on the right, with equal spacing and the same height. Make it look like a before/after or comparison layout."
+DEFAULT_SWAP_PROMPT: Final = "This is a side-by-side composite image. I need you to: 1) Take the person's appearance from the RIGHT side image, 2) Apply that person's appearance to the person on the LEFT side, 3) Keep the LEFT side background, pose, and scene exactly as they are, 4) Only change the person's appearance, not the environment, 5) Return ONLY the left side image with the updated person. The result should be the left side scene with the right side person's appearance."
+
+# Appended to the swap prompt to describe the composite structure
+SWAP_CONTEXT_SUFFIX: Final = " The composite image has two parts: LEFT (scene with person) and RIGHT (person source). Transfer the person's appearance from RIGHT to LEFT, keeping the LEFT scene intact. Return only the LEFT side result."
 
 
 class StagedMergeService:
+    # Upper bound on pipelines run at the same time by `staged_merge_batch`
+    MAX_CONCURRENT_PIPELINES = 8
+    # Largest width or height, in pixels, of each half of a side-by-side composite
+    MAX_COMPOSITE_SIDE = 1536
+    # Composites are only fed back to the API, so quality 85 with 4:2:0 chroma
+    # subsampling is indistinguishable from 95 at a much smaller size
+    COMPOSITE_JPEG_OPTIONS = {'quality': 85, 'progressive': True, 'subsampling': 2}
+
     def __init__(self, api_key: Optional[str] = None):
         """
         Initialize the Staged Merge service.
@@ -20,20 +42,49 @@ class StagedMergeService:
             api_key: Black Forest API key. If None, will use BFL_API_KEY environment variable
         """
         if api_key is None:
+            ensure_env()
             api_key = os.environ.get("BFL_API_KEY")
         
         if not api_key:
             raise ValueError("Black Forest API key is required. Set BFL_API_KEY environment variable or pass api_key parameter.")
         
         self.api_key = api_key
+        # Built once and passed as-is with every request
+        self._submit_headers = {'x-key': api_key, 'Content-Type': 'application/json'}
+        self._poll_headers = {'x-key': api_key}
         self.base_url = "https://api.bfl.ai/v1/flux-kontext-pro"
+        self.result_cache = ResultCache()
+        
+        # Generated files go here; created once instead of before every save
+        self.output_dir = "output"
+        os.makedirs(self.output_dir, exist_ok=True)
+        # Directories known to exist, so caller-supplied paths are only created once
+        self._made_dirs = {self.output_dir}
+        
+        # One pooled session for the whole pipeline: each stage's upload, its poll
+        # requests and the result download all reuse the same HTTPS connection.
+        # The API key is sent per request so it never reaches the result delivery host.
+        self.session = create_session(
+            Retry(
+                total=3,
+                backoff_factor=0.3,
+                status_forcelist=[429, 500, 502, 503, 504],
+                # Hand the final response back so callers can report its status
+                raise_on_status=False
+            ),
+            # Enough connections that concurrent edits and pipelines never wait on the pool
+            pool_maxsize=self.MAX_CONCURRENT_PIPELINES * 4,
+            headers={'accept': 'application/json'}
+        )
     
     def encode_image(self, image_path: str) -> str:
         """Encode an image file to base64 string."""
-        image = Image.open(image_path)
-        buffered = BytesIO()
-        image.save(buffered, format="JPEG")
-        return base64.b64encode(buffered.getvalue()).decode()
+        # Pipeline steps and batched scenes encode the same inputs repeatedly
+        return encode_image_cached(image_path)
+    
+    def encode_image_bytes(self, image_bytes: bytes) -> str:
+        """Encode in-memory image bytes to a base64 JPEG string."""
+        return encode_image_bytes(image_bytes)
     
     def call_black_forest_api(self, image_path: str, prompt: str) -> Dict[str, Any]:
         """
@@ -46,21 +97,33 @@ class StagedMergeService:
         Returns:
             Dictionary containing the API response
         """
-        # Encode the image
-        img_str = self.encode_image(image_path)
+        return self._submit_edit(self.encode_image(image_path), prompt)
+    
+    def call_black_forest_api_from_bytes(self, image_bytes: bytes, prompt: str) -> Dict[str, Any]:
+        """
+        Call the Black Forest API to edit an in-memory image.
         
+        Args:
+            image_bytes: Bytes of the input image
+            prompt: Description of what to edit on the image
+        
+        Returns:
+            Dictionary containing the API response
+        """
+        return self._submit_edit(self.encode_image_bytes(image_bytes), prompt)
+    
+    def _submit_edit(self, img_str: str, prompt: str) -> Dict[str, Any]:
+        """Submit a base64-encoded image and prompt to the Black Forest API."""
         # Make the API request
-        response = requests.post(
+        response = self.session.post(
             self.base_url,
-            headers={
-                'accept': 'application/json',
-                'x-key': self.api_key,
-                'Content-Type': 'application/json',
-            },
-            json={
+            headers=self._submit_headers,
+            # The API only accepts JSON; orjson serializes the multi-MB base64 string much
+            # faster than the stdlib encoder requests would use for json=
+            data=orjson.dumps({
                 'prompt': prompt,
                 'input_image': img_str,
-            },
+            }),
         )
         
         if response.status_code != 200:
@@ -80,43 +143,7 @@ class StagedMergeService:
         Returns:
             Dictionary containing the final result
         """
-        start_time = time.time()
-        
-        while time.time() - start_time < max_wait_time:
-            try:
-                response = requests.get(
-                    polling_url,
-                    headers={
-                        'accept': 'application/json',
-                        'x-key': self.api_key,
-                    },
-                    params={'id': request_id}
-                )
-                
-                if response.status_code != 200:
-                    raise Exception(f"Polling request failed with status {response.status_code}: {response.text}")
-                
-                result = response.json()
-                
-                # Check if the job is complete
-                if result.get("status") == "Ready":
-                    print(f"Image ready: {result.get('result', {}).get('sample', 'No sample URL provided')}")
-                    return result
-                elif result.get("status") in ["Error", "Failed"]:
-                    raise Exception(f"Image editing failed: {result}")
-                
-                # Show polling status
-                elapsed = int(time.time() - start_time)
-                print(f"Polling... (elapsed: {elapsed}s, status: {result.get('status', 'unknown')})")
-                
-                # Wait before polling again
-                time.sleep(0.5)
-                
-            except Exception as e:
-                print(f"Polling error: {e}")
-                time.sleep(1)
-        
-        raise TimeoutError(f"Image editing did not complete within {max_wait_time} seconds")
+        return _poll_for_result(self.session, polling_url, request_id, self._poll_headers, max_wait_time)
     
     def download_and_save_image(self, image_url: str, output_path: str) -> str:
         """
@@ -129,22 +156,63 @@ class StagedMergeService:
         Returns:
             Path to the saved image
         """
-        print(f"Downloading image from: {image_url}")
+        logger.debug("Downloading image from: %s", image_url)
+        
+        # Ensure output directory exists
+        self._ensure_dir(os.path.dirname(output_path))
+        
+        # Stream the image to disk as it arrives rather than buffering it in memory
+        with self.session.get(image_url, stream=True, timeout=60) as response:
+            if response.status_code != 200:
+                raise Exception(f"Failed to download image: {response.status_code}")
+            write_chunks(output_path, response.iter_content(chunk_size=65536))
+        
+        print(f"Image saved as '{output_path}'")
+        return output_path
+    
+    def download_image_bytes(self, image_url: str) -> bytes:
+        """
+        Download an image from a URL into memory.
+        
+        Args:
+            image_url: URL of the image to download
+        
+        Returns:
+            Bytes of the image
+        """
+        logger.debug("Downloading image from: %s", image_url)
         
-        response = requests.get(image_url)
+        response = self.session.get(image_url)
         if response.status_code == 200:
-            # Ensure output directory exists
-            os.makedirs(os.path.dirname(output_path), exist_ok=True)
-            
-            # Save the image
-            with open(output_path, 'wb') as f:
-                f.write(response.content)
-            
-            print(f"Image saved as '{output_path}'")
-            return output_path
+            return response.content
         else:
             raise Exception(f"Failed to download image: {response.status_code}")
     
+    def wait_for_sample_url(self, response_data: Dict[str, Any]) -> str:
+        """
+        Wait for a submitted edit to finish and return the URL of the result image.
+        
+        Args:
+            response_data: Response from the initial API call
+        
+        Returns:
+            URL of the edited image
+        """
+        request_id = response_data["id"]
+        polling_url = response_data["polling_url"]
+        
+        print(f"Request submitted with ID: {request_id}")
+        print("Waiting for result...")
+        
+        result = self.poll_for_result(polling_url, request_id)
+        
+        print("Image editing completed!")
+        
+        if "result" in result and "sample" in result["result"]:
+            return result["result"]["sample"]
+        else:
+            raise Exception("No image URL found in the result")
+    
     def edit_image(self, image_path: str, prompt: str, second_image_path: str = None) -> str:
         """
         Edit an image using the Black Forest API and return the path to the edited image.
@@ -165,28 +233,71 @@ class StagedMergeService:
         if second_image_path and os.path.exists(second_image_path):
             return self.create_side_by_side_composite(image_path, second_image_path)
         
+        output_path = self._output_path("staged_edit")
+        
+        # Identical inputs produce the cached result without calling the API
+        cache_key = self.result_cache.key_for(image_path, prompt)
+        if self.result_cache.fetch(cache_key, output_path):
+            print(f"Using cached result for '{image_path}': '{output_path}'")
+            return output_path
+        
         # Standard single image editing with API
         response_data = self.call_black_forest_api(image_path, prompt)
         
-        # Wait for the result
-        request_id = response_data["id"]
-        polling_url = response_data["polling_url"]
+        # Wait for the result, then download and save it
+        image_url = self.wait_for_sample_url(response_data)
+        self.download_and_save_image(image_url, output_path)
+        self.result_cache.store(cache_key, output_path)
+        return output_path
+    
+    def edit_image_from_bytes(self, image_bytes: bytes, prompt: str) -> str:
+        """
+        Edit an in-memory image using the Black Forest API and save the result to disk.
         
-        print(f"Request submitted with ID: {request_id}")
-        print("Waiting for result...")
+        Args:
+            image_bytes: Bytes of the input image
+            prompt: Description of what to edit on the image
         
-        result = self.poll_for_result(polling_url, request_id)
+        Returns:
+            Path to the saved edited image
+        """
+        output_path = self._output_path("staged_edit")
         
-        print("Image editing completed!")
+        # Identical inputs produce the cached result without calling the API
+        cache_key = self.result_cache.key_for_bytes(image_bytes, prompt)
+        if self.result_cache.fetch(cache_key, output_path):
+            print(f"Using cached result: '{output_path}'")
+            return output_path
         
-        # Download and save the result
-        if "result" in result and "sample" in result["result"]:
-            image_url = result["result"]["sample"]
-            timestamp = int(time.time() * 1000)
-            output_path = f"output/staged_edit_{timestamp}.jpg"
-            return self.download_and_save_image(image_url, output_path)
-        else:
-            raise Exception("No image URL found in the result")
+        response_data = self.call_black_forest_api_from_bytes(image_bytes, prompt)
+        image_url = self.wait_for_sample_url(response_data)
+        self.download_and_save_image(image_url, output_path)
+        self.result_cache.store(cache_key, output_path)
+        return output_path
+    
+    def edit_image_bytes(self, image_bytes: bytes, prompt: str) -> bytes:
+        """
+        Edit an in-memory image using the Black Forest API, without touching the disk.
+        
+        Args:
+            image_bytes: Bytes of the input image
+            prompt: Description of what to edit on the image
+        
+        Returns:
+            Bytes of the edited image
+        """
+        # Identical inputs produce the cached result without calling the API
+        cache_key = self.result_cache.key_for_bytes(image_bytes, prompt)
+        cached = self.result_cache.load(cache_key)
+        if cached is not None:
+            print("Using cached result")
+            return cached
+        
+        response_data = self.call_black_forest_api_from_bytes(image_bytes, prompt)
+        image_url = self.wait_for_sample_url(response_data)
+        edited_bytes = self.download_image_bytes(image_url)
+        self.result_cache.save(cache_key, edited_bytes)
+        return edited_bytes
     
     def create_side_by_side_composite(self, image_path_1: str, image_path_2: str) -> str:
         """
@@ -202,57 +313,97 @@ class StagedMergeService:
         print("Creating side-by-side composite manually...")
         
         # Open both images
-        img1 = Image.open(image_path_1)
-        img2 = Image.open(image_path_2)
+        composite = self._compose_side_by_side(Image.open(image_path_1), Image.open(image_path_2))
         
-        # Convert to RGB if necessary
-        if img1.mode != 'RGB':
-            img1 = img1.convert('RGB')
-        if img2.mode != 'RGB':
-            img2 = img2.convert('RGB')
+        # Save the composite
+        output_path = self._output_path("side_by_side")
+        composite.save(output_path, 'JPEG', **self.COMPOSITE_JPEG_OPTIONS)
+        print(f"Side-by-side composite saved: {output_path}")
         
-        # Get dimensions
-        width1, height1 = img1.size
-        width2, height2 = img2.size
+        return output_path
+    
+    def create_side_by_side_composite_bytes(self, image_bytes_1: bytes, image_bytes_2: bytes) -> bytes:
+        """
+        Create a side-by-side composite of two in-memory images using PIL.
         
-        # Calculate target height (use the larger height)
-        target_height = max(height1, height2)
+        Args:
+            image_bytes_1: Bytes of the first image (left side)
+            image_bytes_2: Bytes of the second image (right side)
         
-        # Resize images to have the same height while maintaining aspect ratio
-        def resize_maintaining_aspect_ratio(img, target_height):
-            width, height = img.size
-            aspect_ratio = width / height
-            new_width = int(target_height * aspect_ratio)
-            return img.resize((new_width, target_height), Image.Resampling.LANCZOS)
+        Returns:
+            JPEG bytes of the composite image
+        """
+        print("Creating side-by-side composite in memory...")
         
-        img1_resized = resize_maintaining_aspect_ratio(img1, target_height)
-        img2_resized = resize_maintaining_aspect_ratio(img2, target_height)
+        composite = self._compose_side_by_side(Image.open(BytesIO(image_bytes_1)), Image.open(BytesIO(image_bytes_2)))
+        
+        buffered = BytesIO()
+        composite.save(buffered, 'JPEG', **self.COMPOSITE_JPEG_OPTIONS)
+        return buffered.getvalue()
+    
+    def _prepare_for_composite(self, img: Image.Image) -> Image.Image:
+        """Decode an image as RGB, shrinking it if it exceeds `MAX_COMPOSITE_SIDE`."""
+        # Let libjpeg decode oversized JPEGs at 1/2, 1/4 or 1/8 scale instead of
+        # at full resolution; a no-op for other formats and already decoded images
+        scale = self.MAX_COMPOSITE_SIDE / max(img.size)
+        if scale < 1:
+            img.draft('RGB', (int(img.width * scale), int(img.height * scale)))
+        
+        # Convert to RGB if necessary
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        
+        # Shrink oversized inputs first so the resize, paste and JPEG encode work on
+        # smaller buffers; the API downsamples large uploads anyway
+        img.thumbnail((self.MAX_COMPOSITE_SIDE, self.MAX_COMPOSITE_SIDE), Image.Resampling.BILINEAR)
+        return img
+    
+    def _output_path(self, prefix: str) -> str:
+        """Build a unique output path; concurrent edits can share a millisecond timestamp."""
+        timestamp = int(time.time() * 1000)
+        return f"{self.output_dir}/{prefix}_{timestamp}_{uuid.uuid4().hex[:8]}.jpg"
+    
+    def _ensure_dir(self, directory: str) -> None:
+        """Create a directory unless this service has already made sure it exists."""
+        if directory and directory not in self._made_dirs:
+            os.makedirs(directory, exist_ok=True)
+            self._made_dirs.add(directory)
+    
+    def _compose_side_by_side(self, img1: Image.Image, img2: Image.Image) -> Image.Image:
+        """Place two images next to each other at the same height."""
+        # PIL releases the GIL while decoding and resampling, so both images are
+        # prepared in parallel
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            img1, img2 = executor.map(self._prepare_for_composite, (img1, img2))
+            
+            # Calculate target height (use the larger height)
+            target_height = max(img1.height, img2.height)
+            
+            # Resize images to have the same height while maintaining aspect ratio
+            def resize_maintaining_aspect_ratio(img):
+                width, height = img.size
+                aspect_ratio = width / height
+                new_width = int(target_height * aspect_ratio)
+                return img.resize((new_width, target_height), Image.Resampling.BILINEAR)
+            
+            img1_resized, img2_resized = executor.map(resize_maintaining_aspect_ratio, (img1, img2))
         
         # Calculate total width for composite
         total_width = img1_resized.width + img2_resized.width
         
-        # Create new image with white background
-        composite = Image.new('RGB', (total_width, target_height), 'white')
+        # The two pastes cover the whole canvas, so leave it uninitialized instead
+        # of filling it with a background color first
+        composite = Image.new('RGB', (total_width, target_height), None)
         
         # Paste images side by side
         composite.paste(img1_resized, (0, 0))
         composite.paste(img2_resized, (img1_resized.width, 0))
         
-        # Save the composite
-        timestamp = int(time.time() * 1000)
-        output_path = f"output/side_by_side_{timestamp}.jpg"
-        
-        # Ensure output directory exists
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        
-        composite.save(output_path, 'JPEG', quality=95)
-        print(f"Side-by-side composite saved: {output_path}")
-        
-        return output_path
+        return composite
     
     def staged_merge_with_kontext(self, image_a_path: str, image_b_path: str, 
-                                 add_person_prompt: str, composite_prompt: str, 
-                                 swap_prompt: str) -> Dict[str, str]:
+                                 add_person_prompt: Optional[str] = None, composite_prompt: Optional[str] = None, 
+                                 swap_prompt: Optional[str] = None) -> Dict[str, str]:
         """
         Perform staged person swap with context preservation: 
         add person to image 1 → composite images → swap people
@@ -260,13 +411,17 @@ class StagedMergeService:
         Args:
             image_a_path: Path to the context image (background scene)
             image_b_path: Path to the person source image
-            add_person_prompt: Prompt to add someone doing something to image 1
-            composite_prompt: Prompt to composite the images
-            swap_prompt: Prompt to swap the people in the final image
+            add_person_prompt: Prompt to add someone doing something to image 1 (default: DEFAULT_ADD_PERSON_PROMPT)
+            composite_prompt: Prompt to composite the images (default: DEFAULT_COMPOSITE_PROMPT)
+            swap_prompt: Prompt to swap the people in the final image (default: DEFAULT_SWAP_PROMPT)
         
         Returns:
             Dictionary containing paths to all generated images
         """
+        add_person_prompt = add_person_prompt or DEFAULT_ADD_PERSON_PROMPT
+        composite_prompt = composite_prompt or DEFAULT_COMPOSITE_PROMPT
+        swap_prompt = swap_prompt or DEFAULT_SWAP_PROMPT
+
         print("🚀 Starting Staged Merge with Kontext")
         print("=" * 50)
         
@@ -277,6 +432,7 @@ class StagedMergeService:
             raise FileNotFoundError(f"Person source image not found: {image_b_path}")
         
         results = {}
+        composite_writer = None
         
         try:
             # Step 1: Add someone doing something to image 1 (don't change background)
@@ -290,7 +446,14 @@ class StagedMergeService:
             # Step 2: Create side-by-side composite
             print("\n🖼️ Step 2: Creating Side-by-Side Composite")
             print(f"Placing {person_added_path} and {image_b_path} side by side")
-            composite_path = self.edit_image(person_added_path, composite_prompt, image_b_path)
+            with open(person_added_path, 'rb') as f1, open(image_b_path, 'rb') as f2:
+                composite_bytes = self.create_side_by_side_composite_bytes(f1.read(), f2.read())
+            
+            # Step 3 uploads the composite straight from memory; the file is only kept
+            # for inspection, so it is written in the background
+            composite_path = self._output_path("side_by_side")
+            composite_writer = threading.Thread(target=write_bytes, args=(composite_path, composite_bytes))
+            composite_writer.start()
             results['composite'] = composite_path
             print(f"✅ Side-by-side composite created: {composite_path}")
             
@@ -300,8 +463,8 @@ class StagedMergeService:
             print("Performing person swap from composite image...")
             
             # Enhanced prompt with more context about the composite structure
-            enhanced_swap_prompt = f"{swap_prompt} The composite image has two parts: LEFT (scene with person) and RIGHT (person source). Transfer the person's appearance from RIGHT to LEFT, keeping the LEFT scene intact. Return only the LEFT side result."
-            final_swap_path = self.edit_image(composite_path, enhanced_swap_prompt)
+            enhanced_swap_prompt = swap_prompt + SWAP_CONTEXT_SUFFIX
+            final_swap_path = self.edit_image_from_bytes(composite_bytes, enhanced_swap_prompt)
             results['final_swap'] = final_swap_path
             print(f"✅ Person swap completed: {final_swap_path}")
             
@@ -320,6 +483,78 @@ class StagedMergeService:
             print(f"❌ Staged merge failed: {e}")
             print(f"Current results: {results}")
             raise
+        
+        finally:
+            # Every returned path must exist by the time the caller sees it
+            if composite_writer is not None:
+                composite_writer.join()
+    
+    def staged_merge_batch(self, jobs: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+        """
+        Run several staged merges concurrently.
+        
+        Each pipeline spends almost all of its time waiting on the API, so they run on
+        a thread pool and share this service's HTTP session.
+        
+        Args:
+            jobs: Keyword arguments for `staged_merge_with_kontext`, one dict per pipeline
+        
+        Returns:
+            The result of each pipeline, in the same order as `jobs`
+        """
+        if not jobs:
+            return []
+        
+        max_workers = min(len(jobs), self.MAX_CONCURRENT_PIPELINES)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(lambda job: self.staged_merge_with_kontext(**job), jobs))
+    
+    def staged_merge_with_kontext_bytes(self, image_a: bytes, image_b: bytes, 
+                                       add_person_prompt: Optional[str] = None, composite_prompt: Optional[str] = None, 
+                                       swap_prompt: Optional[str] = None) -> Dict[str, bytes]:
+        """
+        Perform the staged person swap on in-memory images.
+        
+        Same steps as `staged_merge_with_kontext`, but inputs and intermediate results
+        stay in memory instead of being written to and read back from disk.
+        
+        Args:
+            image_a: Bytes of the context image (background scene)
+            image_b: Bytes of the person source image
+            add_person_prompt: Prompt to add someone doing something to image 1 (default: DEFAULT_ADD_PERSON_PROMPT)
+            composite_prompt: Prompt to composite the images (default: DEFAULT_COMPOSITE_PROMPT)
+            swap_prompt: Prompt to swap the people in the final image (default: DEFAULT_SWAP_PROMPT)
+        
+        Returns:
+            Dictionary containing the JPEG bytes of all generated images
+        """
+        add_person_prompt = add_person_prompt or DEFAULT_ADD_PERSON_PROMPT
+        swap_prompt = swap_prompt or DEFAULT_SWAP_PROMPT
+        
+        print("🚀 Starting Staged Merge with Kontext (in memory)")
+        
+        results = {}
+        
+        try:
+            # Step 1: Add someone doing something to image 1 (don't change background)
+            print("👤 Step 1: Adding Person to Image 1")
+            results['person_added'] = self.edit_image_bytes(image_a, add_person_prompt)
+            
+            # Step 2: Create side-by-side composite (done locally, the prompt is not sent)
+            print("🖼️ Step 2: Creating Side-by-Side Composite")
+            results['composite'] = self.create_side_by_side_composite_bytes(results['person_added'], image_b)
+            
+            # Step 3: Swap the people and show image 1 with person swapped
+            print("🔄 Step 3: Swapping People")
+            results['final_swap'] = self.edit_image_bytes(results['composite'], swap_prompt + SWAP_CONTEXT_SUFFIX)
+            
+            print("✅ Person swap completed successfully!")
+            return results
+            
+        except Exception as e:
+            print(f"❌ Staged merge failed: {e}")
+            print(f"Completed steps: {list(results)}")
+            raise
 
 
 def main():
@@ -343,18 +578,10 @@ def main():
             print(f"❌ Image B not found: {image_b}")
             return
         
-        # Staged merge prompts - 3-step person swap workflow
-        add_person_prompt = "Add a realistic person to this scene in a natural pose. The person should be doing something interesting but believable. Keep the background, lighting, and environment exactly as they are. Only add the person, do not change anything else in the image."
-        composite_prompt = "Create a side-by-side comparison by placing the first image on the left and the second image on the right, with equal spacing and the same height. Make it look like a before/after or comparison layout."
-        swap_prompt = "This is a side-by-side composite image. I need you to: 1) Take the person's appearance from the RIGHT side image, 2) Apply that person's appearance to the person on the LEFT side, 3) Keep the LEFT side background, pose, and scene exactly as they are, 4) Only change the person's appearance, not the environment, 5) Return ONLY the left side image with the updated person. The result should be the left side scene with the right side person's appearance."
-        
-        # Perform staged merge
+        # Perform staged merge with the default 3-step person swap prompts
         results = service.staged_merge_with_kontext(
             image_a_path=image_a,
-            image_b_path=image_b,
-            add_person_prompt=add_person_prompt,
-            composite_prompt=composite_prompt,
-            swap_prompt=swap_prompt
+            image_b_path=image_b
         )
         
         print(f"\n🎯 Final result: {results['final_swap']}")
@@ -1,10 +1,301 @@
 import os
-import requests
+import re
 import math
-from typing import Optional, List, Dict, Any, Tuple
+import logging
+import asyncio
+import itertools
+import httpx
+import requests
+import numpy as np
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from urllib.parse import urlencode
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Dict, Any, Tuple, AsyncIterator, Union
+from urllib3.util.retry import Retry
+from config import ensure_env
+from services.http_session import create_session, backoff_delay
+from services.file_io import write_chunks, write_chunks_async, JPEG_MAGIC
+from services.result_cache import ResultCache
+
+logger = logging.getLogger(__name__)
+
+# A "lat,lng" pair, e.g. "40.758,-73.9855", "+40.7,-73.9", ".5,.5" or "40.,-73."
+_NUMBER = r'[+-]?(?:\d+\.?\d*|\.\d+)'
+_COORD_RE = re.compile(rf'^\s*({_NUMBER})\s*,\s*({_NUMBER})\s*$')
+
+# Degrees of latitude per meter on a spherical Earth of radius 6371 km
+_DEG_PER_M = (180.0 / math.pi) / 6371000.0
+
+# (cos, sin) of each multiple of 45 degrees, from 0 to 315. The default 90 degree FOV
+# at the cardinal headings only ever needs these, and they are exact (e.g. a true 0
+# instead of cos(pi/2) = 6e-17)
+_HALF_SQRT2 = math.sqrt(0.5)
+_COS_SIN_45 = np.array([
+    (1.0, 0.0), (_HALF_SQRT2, _HALF_SQRT2), (0.0, 1.0), (-_HALF_SQRT2, _HALF_SQRT2),
+    (-1.0, 0.0), (-_HALF_SQRT2, -_HALF_SQRT2), (0.0, -1.0), (_HALF_SQRT2, -_HALF_SQRT2)
+])
+
+# Row of each named point in the (6, 2) edge arrays returned by `calculate_image_edges`
+EDGE_ROWS = {
+    'top_left': 0,
+    'top_right': 1,
+    'bottom_left': 2,
+    'bottom_right': 3,
+    'center': 4,
+    'camera_position': 5
+}
+
+# `_edges_kernel_batch` rows (center, left, right) feeding the projected EDGE_ROWS.
+# For simplicity, the bottom corners reuse the top ones; a real implementation might
+# account for pitch and elevation
+_EDGE_SOURCE_ROWS = (1, 2, 1, 2, 0)
+
+# Leading bytes of the image formats Street View may return: JPEG, PNG and WebP (RIFF)
+_IMAGE_MAGIC = (JPEG_MAGIC, b'\x89PNG', b'RIFF')
+
+# Transient statuses worth retrying
+_RETRY_STATUSES = frozenset((408, 429, 500, 502, 503, 504))
+
+# Applied by urllib3 to every Street View and geocoding GET; all of them are idempotent
+_RETRY = Retry(
+    total=3,
+    connect=3,
+    read=3,
+    backoff_factor=0.25,
+    status_forcelist=sorted(_RETRY_STATUSES),
+    allowed_methods=frozenset(['GET']),
+    # Hand the final response back so callers can report its status
+    raise_on_status=False,
+    respect_retry_after_header=True
+)
+
+# Shared by every StreetViewService, so the TLS connections to maps.googleapis.com stay
+# warm even when services are created per request; created on first use
+_SESSION: Optional[requests.Session] = None
+
+# Shared by every AsyncStreetViewService: HTTP/2 multiplexes a whole batch of heading
+# requests and the geocoding call over one connection to maps.googleapis.com
+_ASYNC_CLIENT: Optional[httpx.AsyncClient] = None
+
+
+def _shared_session() -> requests.Session:
+    """Return the shared Street View session, creating it if there is none."""
+    global _SESSION
+    if _SESSION is None:
+        _SESSION = create_session(_RETRY, pool_connections=8, pool_maxsize=64)
+    return _SESSION
+
+
+def _shared_async_client() -> httpx.AsyncClient:
+    """Return the shared HTTP/2 client, creating a new one if there is none or it was closed."""
+    global _ASYNC_CLIENT
+    if _ASYNC_CLIENT is None or _ASYNC_CLIENT.is_closed:
+        _ASYNC_CLIENT = httpx.AsyncClient(
+            timeout=10.0,
+            transport=httpx.AsyncHTTPTransport(
+                http2=True,
+                limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+                retries=2
+            )
+        )
+    return _ASYNC_CLIENT
+
+
+def _parse_coordinates(location: str) -> Optional[Tuple[float, float]]:
+    """Return the (lat, lng) a "lat,lng" string names, or None if it is not a valid pair."""
+    match = _COORD_RE.match(location)
+    if not match:
+        return None
+    lat, lng = float(match.group(1)), float(match.group(2))
+    # Anything out of range is left to the geocoder, like any other address
+    if abs(lat) > 90 or abs(lng) > 180:
+        return None
+    return lat, lng
+
+
+def _edges_kernel(lat: float, lng: float, heading: float, fov: float, distance: float) -> Tuple[Tuple[float, float], ...]:
+    """
+    Project the center, left edge and right edge of a view from a camera position.
+    
+    Plain `math` on Python floats is the fastest option for a single heading; see
+    `_edges_kernel_batch` for many.
+    
+    Returns:
+        (center, left, right), each a (lat, lng) tuple
+    """
+    # Convert heading and FOV to radians
+    heading_rad = math.radians(heading)
+    half_fov_rad = math.radians(fov) / 2
+    
+    # Calculate the angles for each corner
+    left_angle = heading_rad - half_fov_rad
+    right_angle = heading_rad + half_fov_rad
+    
+    # Meters to degrees of latitude, and of longitude at this latitude
+    lat_scale = distance * _DEG_PER_M
+    lng_scale = lat_scale / math.cos(math.radians(lat))
+    
+    return (
+        (lat + math.cos(heading_rad) * lat_scale, lng + math.sin(heading_rad) * lng_scale),
+        (lat + math.cos(left_angle) * lat_scale, lng + math.sin(left_angle) * lng_scale),
+        (lat + math.cos(right_angle) * lat_scale, lng + math.sin(right_angle) * lng_scale),
+    )
+
+
+def _edges_kernel_batch(lat: float, lng: float, headings: np.ndarray, fov: float, distance: float) -> np.ndarray:
+    """
+    Vectorized `_edges_kernel` over an array of headings.
+    
+    Returns:
+        Array of shape (3, len(headings), 2) holding the center, left and right
+        (lat, lng) points of each heading
+    """
+    half_fov = fov / 2
+    angles = np.stack((headings, headings - half_fov, headings + half_fov))
+    
+    # Angles that are all multiples of 45 degrees (e.g. the cardinal headings at the
+    # default FOV) take their cos and sin from a table instead of evaluating them
+    steps, remainder = np.divmod(angles, 45.0)
+    if not remainder.any():
+        cos_sin = _COS_SIN_45[steps.astype(np.intp) % 8]
+    else:
+        radians = np.radians(angles)
+        cos_sin = np.stack((np.cos(radians), np.sin(radians)), axis=-1)
+    
+    # Meters to degrees of latitude, and of longitude at this latitude
+    lat_scale = distance * _DEG_PER_M
+    lng_scale = lat_scale / math.cos(math.radians(lat))
+    
+    return np.array((lat, lng)) + cos_sin * np.array((lat_scale, lng_scale))
+
+
+def edges_as_dict(edges: np.ndarray) -> Dict[str, Tuple[float, float]]:
+    """
+    Convert a (6, 2) edge array into a dictionary of (lat, lng) tuples keyed by `EDGE_ROWS` name.
+    
+    Meant for the serialization boundary, e.g. JSON results. The bottom corners equal
+    the top ones, so each pair shares one tuple object rather than two equal copies.
+    """
+    rows = edges.tolist()
+    left = tuple(rows[EDGE_ROWS['top_left']])
+    right = tuple(rows[EDGE_ROWS['top_right']])
+    return {
+        'top_left': left,
+        'top_right': right,
+        'bottom_left': left,
+        'bottom_right': right,
+        'center': tuple(rows[EDGE_ROWS['center']]),
+        'camera_position': tuple(rows[EDGE_ROWS['camera_position']])
+    }
+
+
+@dataclass
+class BatchResult:
+    """
+    Results of a batch of Street View requests, stored column by column.
+    
+    Entry `i` of every column belongs to heading `degrees[i]`. Columns that do not
+    apply to a result (e.g. `errors` of a successful one) hold None, or False for
+    `cached`.
+    """
+    degrees: np.ndarray
+    success: np.ndarray
+    urls: List[Optional[str]]
+    image_bufs: List[Optional[bytes]]
+    paths: List[Optional[str]]
+    errors: List[Optional[str]]
+    cached: np.ndarray
+    
+    @classmethod
+    def allocate(cls, degrees: List[int]) -> 'BatchResult':
+        """Preallocate the columns for a batch of headings, before any result is known."""
+        count = len(degrees)
+        return cls(
+            degrees=np.asarray(degrees),
+            success=np.zeros(count, dtype=bool),
+            urls=[None] * count,
+            image_bufs=[None] * count,
+            paths=[None] * count,
+            errors=[None] * count,
+            cached=np.zeros(count, dtype=bool)
+        )
+    
+    def __len__(self) -> int:
+        return len(self.degrees)
+    
+    def fill(self, index: int, url: Optional[str] = None, image_buf: Optional[bytes] = None,
+             path: Optional[str] = None, cached: bool = False, error: Optional[str] = None) -> None:
+        """
+        Store the outcome of the request for row `index` in place.
+        
+        Requests write straight into their preallocated row instead of returning a
+        result dictionary each. The row is a failure if `error` is given, otherwise a success.
+        """
+        if error is not None:
+            self.errors[index] = error
+            return
+        
+        self.success[index] = True
+        self.urls[index] = url
+        self.image_bufs[index] = image_buf
+        self.paths[index] = path
+        self.cached[index] = cached
+    
+    def to_list_of_dicts(self) -> List[Dict[str, Any]]:
+        """Convert to one `get_street_view_at_degree` result dictionary per heading."""
+        return [
+            _result_dict(degree, url, image_buf, path, cached, None if success else error)
+            for degree, success, url, image_buf, path, error, cached in zip(
+                self.degrees.tolist(), self.success.tolist(), self.urls, self.image_bufs,
+                self.paths, self.errors, self.cached.tolist())
+        ]
+
+
+class _SingleResult:
+    """
+    Result slot of a single-heading request, with the same `fill` interface as `BatchResult`.
+    
+    Builds the result dictionary directly instead of going through batch columns.
+    """
+    __slots__ = ('degree', 'result')
+    
+    def __init__(self, degree: int):
+        self.degree = degree
+        self.result: Optional[Dict[str, Any]] = None
+    
+    def fill(self, index: int, url: Optional[str] = None, image_buf: Optional[bytes] = None,
+             path: Optional[str] = None, cached: bool = False, error: Optional[str] = None) -> None:
+        """Store the outcome of the request; `index` is ignored."""
+        self.result = _result_dict(self.degree, url, image_buf, path, cached, error)
+
+
+def _result_dict(degree: int, url: Optional[str], image_buf: Optional[bytes], path: Optional[str],
+                 cached: bool, error: Optional[str]) -> Dict[str, Any]:
+    """Build a `get_street_view_at_degree` result dictionary; a failure if `error` is given."""
+    if error is not None:
+        return {'success': False, 'error': error}
+    
+    result = {'success': True}
+    if path is None:
+        result['imageBuffer'] = image_buf
+    else:
+        result['path'] = path
+    result.update(url=url, degree=degree, cached=cached)
+    return result
 
 
 class StreetViewService:
+    # Upper bound on concurrent Street View requests for a single location
+    MAX_CONCURRENT_REQUESTS = 8
+    # Number of geocoded addresses remembered by each service
+    GEOCODE_CACHE_SIZE = 4096
+    # Downloaded images, keyed by request URL. Imagery for a panorama does not change,
+    # but Google does refresh panoramas, so entries are dropped after 30 days
+    IMAGE_CACHE_DIR = "output/cache/streetview"
+    IMAGE_CACHE_MAX_AGE = 30 * 24 * 3600
+
     def __init__(self, api_key: Optional[str] = None):
         """
         Initialize the Street View service.
@@ -13,6 +304,7 @@ class StreetViewService:
             api_key: Google Maps API key. If None, will use GOOGLE_MAPS_API_KEY environment variable
         """
         if api_key is None:
+            ensure_env()
             api_key = os.environ.get("GOOGLE_MAPS_API_KEY")
         
         if not api_key:
@@ -21,8 +313,32 @@ class StreetViewService:
         self.api_key = api_key
         self.base_url = "https://maps.googleapis.com/maps/api/streetview"
         self.geocoding_url = "https://maps.googleapis.com/maps/api/geocode/json"
+        
+        self.image_cache = ResultCache(self.IMAGE_CACHE_DIR, max_age=self.IMAGE_CACHE_MAX_AGE)
+        
+        # Addresses resolve deterministically, so repeat lookups skip the HTTPS round trip
+        self._init_geocode_cache()
+    
+    def _init_geocode_cache(self) -> None:
+        """Set up the cache of geocoded addresses used by `get_coordinates`."""
+        # Wrapping the bound method keeps `self` out of the cache key; failures are not cached
+        self._geocode_cached = lru_cache(maxsize=self.GEOCODE_CACHE_SIZE)(self._geocode)
+    
+    @property
+    def session(self):
+        """HTTP session used for every request of this service."""
+        # Looked up on each use, so a service outlives `close_shared_clients` (e.g. an
+        # app restarted in the same process) and picks up the replacement client
+        return self._create_session()
     
-    def get_street_view_at_degree(self, location: str, degree: int, size: str = '1024x768') -> Dict[str, Any]:
+    def _create_session(self):
+        """Return the HTTP session used for every request of this service."""
+        # Pooled so the concurrent heading requests and the geocoding call reuse warm
+        # TLS connections instead of a handshake each
+        return _shared_session()
+    
+    def get_street_view_at_degree(self, location: str, degree: int, size: str = '1024x768',
+                                  out_path: Optional[str] = None) -> Dict[str, Any]:
         """
         Get a Street View image at a specific degree/heading.
         
@@ -30,78 +346,180 @@ class StreetViewService:
             location: Address or coordinates
             degree: Camera heading in degrees (0-360)
             size: Image size (default: '1024x768')
+            out_path: If given, the image is streamed to this file instead of being
+                returned in memory
         
         Returns:
             Dictionary containing:
                 - success: Boolean indicating success
-                - imageBuffer: Bytes of the image (if successful)
+                - imageBuffer: Bytes of the image (if successful and no out_path)
+                - path: Where the image was saved (if successful and out_path is given)
                 - url: The Street View URL (if successful)
+                - cached: True if the image came from the disk cache (if successful)
                 - error: Error message (if failed)
         """
+        slot = _SingleResult(degree)
+        self._fetch_image(slot, 0, self._url_prefix(location, size) + str(degree), out_path)
+        return slot.result
+    
+    def _url_prefix(self, location: str, size: str) -> str:
+        """
+        Build the Street View URL for a location and size, up to the heading value.
+        
+        Only the heading differs between the images of a batch, so the rest of the
+        query is encoded once and each URL is this prefix plus the heading.
+        """
+        params = {
+            'location': location,
+            'size': size,
+            'pitch': 0,
+            'fov': 90,
+            'key': self.api_key
+        }
+        # urlencode escapes the spaces, commas and '&' found in addresses
+        return f"{self.base_url}?{urlencode(params)}&heading="
+    
+    def _fetch_image(self, batch: Union[BatchResult, _SingleResult], index: int, url: str, out_path: Optional[str] = None) -> None:
+        """Request one Street View image URL and fill row `index` of `batch` with the outcome."""
+        cache_key = self.image_cache.key_for_url(url)
+        if self._load_cached_image(batch, index, cache_key, url, out_path):
+            return
+        
+        # Transient statuses are retried by the session; only network failures that
+        # outlast the retries are reported as failed results
         try:
-            params = {
-                'location': location,
-                'size': size,
-                'heading': degree,
-                'pitch': 0,
-                'fov': 90,
-                'key': self.api_key
-            }
-            
-            url = f"{self.base_url}?{self._build_query_string(params)}"
-            
-            response = requests.get(url)
-            
-            if response.status_code != 200:
-                return {
-                    'success': False,
-                    'error': f'HTTP {response.status_code}: {response.text}'
-                }
-            
-            content_type = response.headers.get('content-type', '')
-            if not content_type.startswith('image/'):
-                return {
-                    'success': False,
-                    'error': f'Expected image response, got: {content_type}'
-                }
-            
-            return {
-                'success': True,
-                'imageBuffer': response.content,
-                'url': url,
-                'degree': degree
-            }
+            with self.session.get(url, stream=out_path is not None) as response:
+                error = self._status_error(response)
+                if error:
+                    batch.fill(index, error=error)
+                    return
+                
+                if out_path is None:
+                    if not response.content.startswith(_IMAGE_MAGIC):
+                        batch.fill(index, error='Expected image response')
+                        return
+                    
+                    self._cache_image_bytes(cache_key, response.content)
+                    batch.fill(index, url=url, image_buf=response.content)
+                    return
+                
+                # Written in 64 KiB chunks as they arrive; the first is checked before
+                # anything is written
+                chunks = response.iter_content(chunk_size=65536)
+                first_chunk = next(chunks, b'')
+                if not first_chunk.startswith(_IMAGE_MAGIC):
+                    batch.fill(index, error='Expected image response')
+                    return
+                
+                write_chunks(out_path, itertools.chain((first_chunk,), chunks))
+                self._cache_image_file(cache_key, out_path)
+                batch.fill(index, url=url, path=out_path)
             
-        except Exception as e:
-            return {
-                'success': False,
-                'error': str(e)
-            }
+        except requests.RequestException as e:
+            batch.fill(index, error=str(e))
+    
+    def _load_cached_image(self, batch: Union[BatchResult, _SingleResult], index: int, cache_key: str, url: str, out_path: Optional[str] = None) -> bool:
+        """Fill row `index` of `batch` from a previously downloaded image; returns False on a cache miss."""
+        if out_path is None:
+            data = self.image_cache.load(cache_key)
+            if data is None:
+                return False
+            batch.fill(index, url=url, image_buf=data, cached=True)
+            return True
+        
+        # Shares the cached file through a hard link instead of writing a copy
+        if not self.image_cache.fetch(cache_key, out_path):
+            return False
+        batch.fill(index, url=url, path=out_path, cached=True)
+        return True
     
-    def get_street_view_at_degrees(self, location: str, degrees: List[int], size: str = '1024x768') -> List[Dict[str, Any]]:
+    def _cache_image_bytes(self, cache_key: str, data: bytes) -> None:
+        """Add downloaded image bytes to the disk cache; a failed write only loses the cache entry."""
+        try:
+            self.image_cache.save(cache_key, data)
+        except OSError as e:
+            logger.warning(f"Could not cache Street View image {cache_key}: {e}")
+    
+    def _cache_image_file(self, cache_key: str, path: str) -> None:
+        """Add a downloaded image file to the disk cache; a failed link only loses the cache entry."""
+        try:
+            self.image_cache.store(cache_key, path)
+        except OSError as e:
+            logger.warning(f"Could not cache Street View image {cache_key}: {e}")
+    
+    @staticmethod
+    def _status_error(response) -> Optional[str]:
+        """
+        Format a non-200 Street View response as an error string; None for a 200.
+        
+        The body of a 200 response is checked separately, against `_IMAGE_MAGIC`, by
+        the caller that streams it.
+        """
+        if response.status_code != 200:
+            return f'HTTP {response.status_code}: {response.text}'
+        return None
+    
+    def get_street_view_at_degrees(self, location: str, degrees: List[int], size: str = '1024x768',
+                                   out_paths: Optional[List[str]] = None) -> List[Dict[str, Any]]:
         """
         Get Street View images at multiple degrees.
         
+        Same as `get_street_view_batch`, but with the results as dictionaries.
+        
         Args:
             location: Address or coordinates
             degrees: List of camera headings in degrees (0-360)
             size: Image size (default: '1024x768')
+            out_paths: If given, one file path per degree that the images are streamed
+                to instead of being returned in memory
         
         Returns:
             List of dictionaries, each containing:
                 - success: Boolean indicating success
-                - imageBuffer: Bytes of the image (if successful)
+                - imageBuffer: Bytes of the image (if successful and no out_paths)
+                - path: Where the image was saved (if successful and out_paths is given)
                 - url: The Street View URL (if successful)
                 - degree: The degree used
                 - error: Error message (if failed)
+            Results are in the same order as `degrees`.
+        """
+        return self.get_street_view_batch(location, degrees, size, out_paths).to_list_of_dicts()
+    
+    def get_street_view_batch(self, location: str, degrees: List[int], size: str = '1024x768',
+                              out_paths: Optional[List[str]] = None) -> BatchResult:
         """
-        results = []
+        Get Street View images at multiple degrees, as columns.
         
-        for degree in degrees:
-            result = self.get_street_view_at_degree(location, degree, size)
-            results.append(result)
+        The requests for each degree are independent, so they are issued concurrently
+        and the total latency is that of the slowest request rather than their sum.
         
-        return results
+        Args:
+            location: Address or coordinates
+            degrees: List of camera headings in degrees (0-360)
+            size: Image size (default: '1024x768')
+            out_paths: If given, one file path per degree that the images are streamed
+                to instead of being returned in memory
+        
+        Returns:
+            The results, one row per entry of `degrees`
+        """
+        batch = BatchResult.allocate(degrees)
+        if not degrees:
+            return batch
+        
+        if out_paths is None:
+            out_paths = [None] * len(degrees)
+        
+        prefix = self._url_prefix(location, size)
+        
+        max_workers = min(len(degrees), self.MAX_CONCURRENT_REQUESTS)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # Consume the iterator so any unexpected error is raised here
+            list(executor.map(
+                lambda index: self._fetch_image(batch, index, prefix + str(degrees[index]), out_paths[index]),
+                range(len(degrees))
+            ))
+        return batch
     
     def get_coordinates(self, location: str) -> Tuple[float, float]:
         """
@@ -114,21 +532,27 @@ class StreetViewService:
             Tuple of (latitude, longitude)
         """
         # If location is already coordinates, parse them
-        if ',' in location and all(c.isdigit() or c in '.-, ' for c in location):
-            try:
-                coords = location.replace(' ', '').split(',')
-                return float(coords[0]), float(coords[1])
-            except:
-                pass
+        coordinates = _parse_coordinates(location)
+        if coordinates is not None:
+            return coordinates
         
-        # Otherwise, geocode the address
+        # Otherwise, geocode the address, normalizing case and whitespace so trivially
+        # different spellings share a cache entry
+        return self._geocode_cached(' '.join(location.lower().split()))
+    
+    def _geocode(self, address: str) -> Tuple[float, float]:
+        """Look up the coordinates of an address with the Geocoding API."""
         params = {
-            'address': location,
+            'address': address,
             'key': self.api_key
         }
         
-        response = requests.get(self.geocoding_url, params=params)
-        
+        response = self.session.get(self.geocoding_url, params=params)
+        return self._parse_geocode(response)
+    
+    @staticmethod
+    def _parse_geocode(response) -> Tuple[float, float]:
+        """Extract the coordinates of the first match from a Geocoding API response."""
         if response.status_code != 200:
             raise Exception(f"Geocoding failed: {response.status_code}")
         
@@ -140,7 +564,7 @@ class StreetViewService:
         location_data = data['results'][0]['geometry']['location']
         return location_data['lat'], location_data['lng']
     
-    def calculate_image_edges(self, lat: float, lng: float, heading: int, fov: int = 90, distance: float = 100) -> Dict[str, Tuple[float, float]]:
+    def calculate_image_edges(self, lat: float, lng: float, heading: int, fov: int = 90, distance: float = 100) -> np.ndarray:
         """
         Calculate the coordinates of the edges of a Street View image.
         
@@ -152,52 +576,40 @@ class StreetViewService:
             distance: Distance in meters to project the edges (default: 100)
         
         Returns:
-            Dictionary with edge coordinates:
-                - 'top_left': (lat, lng)
-                - 'top_right': (lat, lng)
-                - 'bottom_left': (lat, lng)
-                - 'bottom_right': (lat, lng)
-                - 'center': (lat, lng) - center of the image
-                - 'camera_position': (lat, lng)
-        """
-        # Convert heading and FOV to radians
-        heading_rad = math.radians(heading)
-        fov_rad = math.radians(fov)
-        
-        # Calculate the angles for each corner
-        left_angle = heading_rad - fov_rad / 2
-        right_angle = heading_rad + fov_rad / 2
-        
-        # Earth's radius in meters
-        earth_radius = 6371000
-        
-        # Calculate the center point of the image
-        center_lat = lat + (distance * math.cos(heading_rad)) / earth_radius * (180 / math.pi)
-        center_lng = lng + (distance * math.sin(heading_rad)) / (earth_radius * math.cos(math.radians(lat))) * (180 / math.pi)
-        
-        # Calculate the left edge
-        left_lat = lat + (distance * math.cos(left_angle)) / earth_radius * (180 / math.pi)
-        left_lng = lng + (distance * math.sin(left_angle)) / (earth_radius * math.cos(math.radians(lat))) * (180 / math.pi)
-        
-        # Calculate the right edge
-        right_lat = lat + (distance * math.cos(right_angle)) / earth_radius * (180 / math.pi)
-        right_lng = lng + (distance * math.sin(right_angle)) / (earth_radius * math.cos(math.radians(lat))) * (180 / math.pi)
-        
-        # For simplicity, we'll use the same distance for top/bottom
-        # In a real implementation, you might want to account for pitch and elevation
-        top_lat = center_lat + (distance * 0.1) / earth_radius * (180 / math.pi)
-        top_lng = center_lng
-        bottom_lat = center_lat - (distance * 0.1) / earth_radius * (180 / math.pi)
-        bottom_lng = center_lng
-        
-        return {
-            'top_left': (left_lat, left_lng),
-            'top_right': (right_lat, right_lng),
-            'bottom_left': (left_lat, left_lng),  # Simplified
-            'bottom_right': (right_lat, right_lng),  # Simplified
-            'center': (center_lat, center_lng),
-            'camera_position': (lat, lng)
-        }
+            Array of shape (6, 2) holding one (lat, lng) row per point, indexed by
+            `EDGE_ROWS`: top_left, top_right, bottom_left, bottom_right, center (center
+            of the image) and camera_position. Use `edges_as_dict` for a dictionary
+        """
+        center, left, right = _edges_kernel(lat, lng, heading, fov, distance)
+        
+        # Bottom corners reuse the top ones (see _EDGE_SOURCE_ROWS)
+        return np.array((left, right, left, right, center, (lat, lng)))
+    
+    def calculate_image_edges_batch(self, lat: float, lng: float, headings: List[int], fov: int = 90, distance: float = 100) -> np.ndarray:
+        """
+        Calculate the edge coordinates of Street View images at several headings from one position.
+        
+        Vectorized counterpart of `calculate_image_edges`: the trigonometry runs once over
+        all headings instead of once per image.
+        
+        Args:
+            lat: Latitude of the camera position
+            lng: Longitude of the camera position
+            headings: Camera headings in degrees (0-360)
+            fov: Field of view in degrees (default: 90)
+            distance: Distance in meters to project the edges (default: 100)
+        
+        Returns:
+            Array of shape (len(headings), 6, 2) holding the `calculate_image_edges`
+            array of each heading
+        """
+        points = _edges_kernel_batch(lat, lng, np.asarray(headings, dtype=np.float64), fov, distance)
+        
+        # The whole batch is written into one preallocated array
+        edges = np.empty((len(headings), len(EDGE_ROWS), 2))
+        edges[:, :len(_EDGE_SOURCE_ROWS)] = points[_EDGE_SOURCE_ROWS, :].transpose(1, 0, 2)
+        edges[:, EDGE_ROWS['camera_position']] = (lat, lng)
+        return edges
     
     def get_street_view_with_coordinates(self, location: str, degree: int, size: str = '1024x768', fov: int = 90) -> Dict[str, Any]:
         """
@@ -221,23 +633,12 @@ class StreetViewService:
         # Get coordinates for the location
         try:
             lat, lng = self.get_coordinates(location)
-            
-            # Calculate edge coordinates
-            edges = self.calculate_image_edges(lat, lng, degree, fov)
-            
-            # Add coordinate information to the result
-            image_result.update({
-                'coordinates': {
-                    'camera_position': (lat, lng),
-                    'edges': edges
-                }
-            })
-            
         except Exception as e:
             # If coordinate calculation fails, still return the image
             image_result['coordinate_error'] = str(e)
+            return image_result
         
-        return image_result
+        return self._attach_edges(image_result, lat, lng, degree, fov)
     
     def get_street_view_at_degrees_with_coordinates(self, location: str, degrees: List[int], size: str = '1024x768', fov: int = 90) -> List[Dict[str, Any]]:
         """
@@ -250,19 +651,282 @@ class StreetViewService:
             fov: Field of view in degrees (default: 90)
         
         Returns:
-            List of dictionaries with image data and edge coordinates
+            List of dictionaries with image data and edge coordinates, in the same
+            order as `degrees`
         """
-        results = []
+        if not degrees:
+            return []
+        
+        # The location is geocoded once for all headings, alongside the image requests
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            coordinates = executor.submit(self.get_coordinates, location)
+            results = self.get_street_view_at_degrees(location, degrees, size)
+        
+        try:
+            lat, lng = coordinates.result()
+        except Exception as e:
+            # If coordinate calculation fails, still return the images
+            for result in results:
+                if result['success']:
+                    result['coordinate_error'] = str(e)
+            return results
         
-        for degree in degrees:
-            result = self.get_street_view_with_coordinates(location, degree, size, fov)
-            results.append(result)
+        return self._attach_edges_batch(results, degrees, lat, lng, fov)
+    
+    def _attach_edges(self, image_result: Dict[str, Any], lat: float, lng: float, degree: int, fov: int) -> Dict[str, Any]:
+        """Add the camera position and edge coordinates to an image result, given an already geocoded location."""
+        edges = edges_as_dict(self.calculate_image_edges(lat, lng, degree, fov))
+        image_result['coordinates'] = {
+            'camera_position': edges['camera_position'],
+            'edges': edges
+        }
+        return image_result
+    
+    def _attach_edges_batch(self, results: List[Dict[str, Any]], degrees: List[int], lat: float, lng: float, fov: int) -> List[Dict[str, Any]]:
+        """Add the camera position and edge coordinates to every successful result of a batch."""
+        # Edges for every successful heading in one vectorized pass
+        captured = [i for i, result in enumerate(results) if result['success']]
+        if captured:
+            edges = self.calculate_image_edges_batch(lat, lng, [degrees[i] for i in captured], fov)
+            for row, i in enumerate(captured):
+                points = edges_as_dict(edges[row])
+                results[i]['coordinates'] = {
+                    'camera_position': points['camera_position'],
+                    'edges': points
+                }
         
         return results
+
+
+class AsyncStreetViewService(StreetViewService):
+    """
+    asyncio counterpart of `StreetViewService`, for callers running on an event loop.
+    
+    The public methods take the same arguments and return the same results, but are
+    coroutines. A batch of headings is issued with `asyncio.gather` over the shared
+    HTTP/2 client instead of a thread per heading, so concurrent sessions do not
+    multiply worker threads.
+    """
+    # Attempts per request, including the first, when the response status is transient.
+    # Matches the sync session's retry policy; connect failures are retried by the transport
+    MAX_ATTEMPTS = _RETRY.total + 1
+    
+    def _init_geocode_cache(self) -> None:
+        # lru_cache would cache the coroutine objects, which can only be awaited once,
+        # so results are kept in a bounded LRU dict instead
+        self._geocode_results: OrderedDict = OrderedDict()
     
-    def _build_query_string(self, params: Dict[str, Any]) -> str:
-        """Build a query string from parameters."""
-        return '&'.join([f"{k}={v}" for k, v in params.items() if v is not None])
+    def _create_session(self) -> httpx.AsyncClient:
+        return _shared_async_client()
+    
+    async def _get(self, url: str, stream: bool = False, **kwargs: Any) -> httpx.Response:
+        """
+        GET a URL, retrying transient statuses.
+        
+        Waits as long as the server's Retry-After header asks (in seconds, capped at
+        the retry policy's backoff maximum), otherwise a jittered exponential backoff.
+        With `stream`, the body is not read yet and the caller must close the response.
+        """
+        for attempt in range(self.MAX_ATTEMPTS):
+            request = self.session.build_request('GET', url, **kwargs)
+            response = await self.session.send(request, stream=stream)
+            if response.status_code not in _RETRY_STATUSES or attempt == self.MAX_ATTEMPTS - 1:
+                return response
+            
+            await response.aclose()
+            
+            await asyncio.sleep(self._retry_delay(response, attempt))
+    
+    @staticmethod
+    def _retry_delay(response: httpx.Response, attempt: int) -> float:
+        """Return how long to wait before retrying a response with a transient status."""
+        try:
+            retry_after = float(response.headers['retry-after'])
+        except (KeyError, ValueError):
+            retry_after = math.nan
+        # Missing, HTTP-date, unparsable and infinite values fall back to the backoff
+        if not math.isfinite(retry_after):
+            return backoff_delay(attempt, _RETRY.backoff_factor, 2.0)
+        return min(max(retry_after, 0.0), _RETRY.backoff_max)
+    
+    async def get_street_view_at_degree(self, location: str, degree: int, size: str = '1024x768',
+                                        out_path: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Get a Street View image at a specific degree/heading.
+        
+        See `StreetViewService.get_street_view_at_degree`. With `out_path`, the image
+        is streamed to the file as it downloads.
+        """
+        slot = _SingleResult(degree)
+        await self._fetch_image(slot, 0, self._url_prefix(location, size) + str(degree), out_path)
+        return slot.result
+    
+    async def _fetch_image(self, batch: Union[BatchResult, _SingleResult], index: int, url: str, out_path: Optional[str] = None) -> None:
+        """Request one Street View image URL and fill row `index` of `batch` with the outcome."""
+        cache_key = self.image_cache.key_for_url(url)
+        if await asyncio.to_thread(self._load_cached_image, batch, index, cache_key, url, out_path):
+            return
+        
+        try:
+            response = await self._get(url, stream=True)
+            try:
+                if response.status_code != 200:
+                    # The error text is part of the reported error
+                    await response.aread()
+                error = self._status_error(response)
+                if error:
+                    batch.fill(index, error=error)
+                    return
+                
+                if out_path is None:
+                    content = await response.aread()
+                    if not content.startswith(_IMAGE_MAGIC):
+                        batch.fill(index, error='Expected image response')
+                        return
+                    
+                    await asyncio.to_thread(self._cache_image_bytes, cache_key, content)
+                    batch.fill(index, url=url, image_buf=content)
+                    return
+                
+                # Written in 64 KiB chunks as they arrive; the first is checked before
+                # anything is written
+                chunks = response.aiter_bytes(65536)
+                first_chunk = await anext(chunks, b'')
+                if not first_chunk.startswith(_IMAGE_MAGIC):
+                    batch.fill(index, error='Expected image response')
+                    return
+                
+                await write_chunks_async(out_path, _prepend(first_chunk, chunks))
+            finally:
+                await response.aclose()
+        except httpx.HTTPError as e:
+            batch.fill(index, error=str(e))
+            return
+        
+        await asyncio.to_thread(self._cache_image_file, cache_key, out_path)
+        batch.fill(index, url=url, path=out_path)
+    
+    async def get_street_view_at_degrees(self, location: str, degrees: List[int], size: str = '1024x768',
+                                         out_paths: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Get Street View images at multiple degrees, all requested concurrently.
+        
+        See `StreetViewService.get_street_view_at_degrees`. Results are in the same
+        order as `degrees`.
+        """
+        return (await self.get_street_view_batch(location, degrees, size, out_paths)).to_list_of_dicts()
+    
+    async def get_street_view_batch(self, location: str, degrees: List[int], size: str = '1024x768',
+                                    out_paths: Optional[List[str]] = None) -> BatchResult:
+        """Get Street View images at multiple degrees, as columns; see `StreetViewService.get_street_view_batch`."""
+        batch = BatchResult.allocate(degrees)
+        if out_paths is None:
+            out_paths = [None] * len(degrees)
+        
+        prefix = self._url_prefix(location, size)
+        
+        await asyncio.gather(*[
+            self._fetch_image(batch, index, prefix + str(degree), out_paths[index])
+            for index, degree in enumerate(degrees)
+        ])
+        return batch
+    
+    async def get_coordinates(self, location: str) -> Tuple[float, float]:
+        """Get coordinates (lat, lng) for a location string; see `StreetViewService.get_coordinates`."""
+        coordinates = _parse_coordinates(location)
+        if coordinates is not None:
+            return coordinates
+        
+        address = ' '.join(location.lower().split())
+        coordinates = self._geocode_results.get(address)
+        if coordinates is not None:
+            self._geocode_results.move_to_end(address)
+            return coordinates
+        
+        # Failures raise before reaching the cache, so they are retried next time
+        coordinates = await self._geocode(address)
+        self._geocode_results[address] = coordinates
+        if len(self._geocode_results) > self.GEOCODE_CACHE_SIZE:
+            self._geocode_results.popitem(last=False)
+        return coordinates
+    
+    async def _geocode(self, address: str) -> Tuple[float, float]:
+        """Look up the coordinates of an address with the Geocoding API."""
+        response = await self._get(self.geocoding_url, params={'address': address, 'key': self.api_key})
+        return self._parse_geocode(response)
+    
+    async def get_street_view_with_coordinates(self, location: str, degree: int, size: str = '1024x768', fov: int = 90) -> Dict[str, Any]:
+        """Get Street View image with calculated edge coordinates; see `StreetViewService.get_street_view_with_coordinates`."""
+        image_result = await self.get_street_view_at_degree(location, degree, size)
+        
+        if not image_result['success']:
+            return image_result
+        
+        try:
+            lat, lng = await self.get_coordinates(location)
+        except Exception as e:
+            # If coordinate calculation fails, still return the image
+            image_result['coordinate_error'] = str(e)
+            return image_result
+        
+        return self._attach_edges(image_result, lat, lng, degree, fov)
+    
+    async def get_street_view_at_degrees_with_coordinates(self, location: str, degrees: List[int], size: str = '1024x768', fov: int = 90) -> List[Dict[str, Any]]:
+        """
+        Get Street View images at multiple degrees with edge coordinates.
+        
+        The location is geocoded once, concurrently with the image requests. See
+        `StreetViewService.get_street_view_at_degrees_with_coordinates`.
+        """
+        if not degrees:
+            return []
+        
+        prefix = self._url_prefix(location, size)
+        batch = BatchResult.allocate(degrees)
+        coordinates, *outcomes = await asyncio.gather(
+            self.get_coordinates(location),
+            *[self._fetch_image(batch, index, prefix + str(degree)) for index, degree in enumerate(degrees)],
+            return_exceptions=True
+        )
+        
+        # A heading that raised is reported as a failed row rather than failing the batch
+        for index, outcome in enumerate(outcomes):
+            if isinstance(outcome, BaseException):
+                batch.fill(index, error=str(outcome))
+        results = batch.to_list_of_dicts()
+        
+        if isinstance(coordinates, BaseException):
+            # If coordinate calculation fails, still return the images
+            for result in results:
+                if result['success']:
+                    result['coordinate_error'] = str(coordinates)
+            return results
+        
+        lat, lng = coordinates
+        return self._attach_edges_batch(results, degrees, lat, lng, fov)
+
+
+async def _prepend(first_chunk: bytes, chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Yield an already consumed first chunk, then the rest of an async byte stream."""
+    yield first_chunk
+    async for chunk in chunks:
+        yield chunk
+
+
+async def close_shared_clients() -> None:
+    """
+    Close the session and HTTP/2 client shared by every `StreetViewService` and
+    `AsyncStreetViewService`.
+
+    Both are dropped rather than kept closed, so the next request creates new ones.
+    """
+    global _SESSION, _ASYNC_CLIENT
+    session, client = _SESSION, _ASYNC_CLIENT
+    _SESSION = _ASYNC_CLIENT = None
+    if session is not None:
+        session.close()
+    if client is not None:
+        await client.aclose()
 
 
 if __name__ == "__main__":
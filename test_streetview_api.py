@@ -43,24 +43,47 @@ def test_process_streetview():
     
     print(f"Status: {response.status_code}")
     
-    if response.status_code == 200:
+    if response.status_code != 200:
+        print(f"Error: {response.text}")
+        return None
+    
+    session_id = response.json()['session_id']
+    print(f"Session ID: {session_id}")
+    
+    # Processing runs in the background, poll until it finishes
+    result = wait_for_session(session_id)
+    print(f"Status: {result['status']}")
+    
+    if result['status'] != 'completed':
+        print(f"Error: {result.get('error')}")
+        return None
+    
+    print(f"Total images captured: {result['results']['total_captured']}")
+    print()
+    
+    # List all street view images
+    print("Street View Images:")
+    for img in result['results']['images']:
+        status = "✅" if img['success'] else "❌"
+        print(f"  {status} {img['angle']}°: {img['filepath']}")
+    
+    return session_id
+
+def wait_for_session(session_id, timeout=600, interval=2):
+    """Poll the status endpoint until the session completes or fails"""
+    start_time = time.time()
+    
+    while time.time() - start_time < timeout:
+        response = requests.get(f"{BASE_URL}/status/{session_id}")
         result = response.json()
-        print(f"Session ID: {result['session_id']}")
-        print(f"Status: {result['status']}")
-        print(f"Total images captured: {result['results']['total_captured']}")
-        print(f"AI processed image: {result['results']['ai_processed']}")
-        print()
         
-        # List all street view images
-        print("Street View Images:")
-        for img in result['results']['street_view_images']:
-            status = "✅" if img['success'] else "❌"
-            print(f"  {status} {img['angle']}°: {img['filepath']}")
+        if result['status'] in ('completed', 'failed'):
+            return result
         
-        return result['session_id']
-    else:
-        print(f"Error: {response.text}")
-        return None
+        print(f"  ...{result['status']} ({int(time.time() - start_time)}s)")
+        time.sleep(interval)
+    
+    return {'status': 'timeout', 'error': f"Session did not finish within {timeout} seconds"}
 
 def test_session_info(session_id):
     """Test getting session information"""
@@ -107,8 +130,7 @@ def main():
         test_session_info(session_id)
         
         # Test downloading images
-        test_download_image(session_id, "1_ai_processed")
-        test_download_image(session_id, "1")
+        test_download_image(session_id, "1")  # AI processed
         test_download_image(session_id, "2")
     
     print("\n✅ All tests completed!")